@@ -0,0 +1,133 @@
+"""Benchmarks of the sbu_sim hot paths, run with ``asv run``."""
+from queue import Queue
+
+import numpy as np
+from bluesky import RunEngine
+
+from sbu_sim import synthetic, ticu
+from sbu_sim.adaptive_integration import (
+    extract_arrays,
+    per_event_adaptive_plan,
+    per_event_plan_step_factory,
+)
+
+INDEPENDENT_KEYS = ["ctrl_Ti", "ctrl_anneal_time", "ctrl_temp"]
+
+
+class Load:
+    params = [100, 1000]
+    param_names = ["n_runs"]
+
+    def setup(self, n_runs):
+        self.cat = synthetic.make_catalog(n_runs)
+        self.dataset = ticu.load_dataset(self.cat, ticu.DEFAULT_PEAK_LOCATIONS)
+
+    def time_load_dataset(self, n_runs):
+        ticu.load_dataset(self.cat, ticu.DEFAULT_PEAK_LOCATIONS)
+
+    def time_reduce_data(self, n_runs):
+        ticu.reduce_data(next(iter(self.cat.values())), ticu.DEFAULT_PEAK_LOCATIONS)
+
+    def time_build_full_interpolator(self, n_runs):
+        ticu.InterpolationCore(self.dataset.coords, self.dataset.I)
+
+    def time_build_roi_interpolator(self, n_runs):
+        ticu.InterpolationCore(self.dataset.coords, self.dataset.rois)
+
+    def peakmem_load_dataset(self, n_runs):
+        ticu.load_dataset(self.cat, ticu.DEFAULT_PEAK_LOCATIONS)
+
+
+class BuildLarge:
+    params = [10 ** 4, 10 ** 5]
+    param_names = ["n_runs"]
+    timeout = 300
+
+    def setup(self, n_runs):
+        self.dataset = synthetic.make_dataset(n_runs, 500, seed=0)
+
+    def time_build_roi_interpolator(self, n_runs):
+        ticu.InterpolationCore(self.dataset.coords, self.dataset.rois)
+
+
+class Trigger:
+    params = ["full", "rois"]
+    param_names = ["detector"]
+
+    def setup(self, detector):
+        devices = ticu.make_sim_devices(synthetic.make_catalog(500))
+        self.ctrl = devices["ctrl"]
+        self.det = devices[detector]
+        # build the interpolation outside of the timing
+        self.det.trigger()
+        self.targets = iter(np.random.default_rng(1).uniform(20, 80, 10 ** 6))
+
+    def time_trigger(self, detector):
+        # move every time so the ROI detector's cache does not hide the work
+        self.ctrl.Ti.set(next(self.targets))
+        self.det.trigger()
+
+
+class Callback:
+    def setup(self):
+        self.payload = {k: 1.0 for k in INDEPENDENT_KEYS + ["rois_I_00"]}
+        callback, self.queue = per_event_plan_step_factory(
+            np.ones(3), INDEPENDENT_KEYS, ["rois_I_00"], max_count=10 ** 9, queue=Queue()
+        )
+        callback("start", {"uid": "start", "time": 0})
+        callback(
+            "descriptor",
+            {
+                "uid": "descriptor",
+                "run_start": "start",
+                "name": "primary",
+                "time": 0,
+                "data_keys": {
+                    k: {"dtype": "number", "shape": [], "source": ""} for k in self.payload
+                },
+            },
+        )
+        self.callback = callback
+        self.seq_num = 0
+
+    def time_extract_arrays(self):
+        extract_arrays(INDEPENDENT_KEYS, ["rois_I_00"], self.payload)
+
+    def time_event_page(self):
+        self.seq_num += 1
+        self.callback(
+            "event_page",
+            {
+                "uid": [str(self.seq_num)],
+                "descriptor": "descriptor",
+                "seq_num": [self.seq_num],
+                "time": [0],
+                "data": {k: [v] for k, v in self.payload.items()},
+                "timestamps": {k: [0] for k in self.payload},
+                "filled": {},
+            },
+        )
+        self.queue.get_nowait()
+
+
+class ClosedLoop:
+    timeout = 120
+
+    def setup(self):
+        devices = ticu.make_sim_devices(synthetic.make_catalog(500))
+        self.ctrl, self.rois = devices["ctrl"], devices["rois"]
+        self.rois.trigger()
+        self.RE = RunEngine({})
+
+    def time_per_event_adaptive_plan(self):
+        callback, queue = per_event_plan_step_factory(
+            np.array([1.0, 0.5, 2.0]), INDEPENDENT_KEYS, ["rois_I_00"], max_count=20
+        )
+        self.RE(
+            per_event_adaptive_plan(
+                [self.rois],
+                {self.ctrl.Ti: 20, self.ctrl.anneal_time: 10, self.ctrl.temp: 350},
+                to_brains=callback,
+                from_brains=queue,
+            )
+        )
@@ -2,10 +2,42 @@ from ._version import get_versions
 
 __version__ = get_versions()["version"]
 del get_versions
-from . import ticu
 
+# The submodules pull in ophyd, bluesky and scipy which take over a second
+# to import, so only load them when they are first used.
+_SUBMODULES = {
+    "adaptive_integration",
+    "headless",
+    "packed",
+    "server",
+    "sweep",
+    "synthetic",
+    "ticu",
+    "trace",
+}
 
-def initialize(user_ns, broker_name, reduced_cat_name):
+
+def __getattr__(name):
+    if name in _SUBMODULES:
+        import importlib
+
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | _SUBMODULES)
+
+
+def initialize(
+    user_ns,
+    broker_name,
+    reduced_cat_name,
+    *,
+    trace_path=None,
+    background=False,
+    server=None,
+):
     """
     Initialize an interactive name space for use.
 
@@ -19,15 +51,38 @@ def initialize(user_ns, broker_name, reduced_cat_name):
 
     reduced_cat_name : str
         The catalog that has the reduced TiCu data available
+
+    trace_path : str, optional
+        If given, record a Chrome trace of the session (see `sbu_sim.trace`)
+        and write it to this path when Python exits.
+
+    background : bool, default False
+        If True, put the simulated devices into *user_ns* right away and
+        load the reduced data in a background thread.  The first trigger
+        of a detector waits for the data.
+
+    server : str, optional
+        The socket of a ``python -m sbu_sim serve`` process to get the
+        simulated data from, *reduced_cat_name* is then not read.
     """
+    import atexit
     import nslsii
     import databroker
+    from . import ticu, trace
+
+    if trace_path is not None:
+        atexit.register(trace.enable(trace_path).write)
 
     ret = nslsii.configure_base(
         user_ns, broker_name, configure_logging=False, ipython_logging=False
     )
     user_ns["db"] = user_ns["db"].v2
-    ticu_sim = ticu.make_sim_devices(databroker.catalog[reduced_cat_name])
+    if server is not None:
+        ticu_sim = ticu.make_sim_devices(server=server)
+    else:
+        ticu_sim = ticu.make_sim_devices(
+            databroker.catalog[reduced_cat_name], background=background
+        )
     if set(user_ns).intersection(ticu_sim):
         overlap = set(user_ns).intersection(ret)
         raise ValueError(f"there are overlapping names {overlap}")
@@ -0,0 +1,79 @@
+"""Command line tools, run as ``python -m sbu_sim <command>``."""
+import argparse
+
+
+def _pack(args):
+    import databroker
+    from . import packed
+
+    packed.pack_catalog(
+        databroker.catalog[args.catalog],
+        args.output,
+        args.peaks,
+        provenance={"catalog": args.catalog},
+        dtype=args.dtype,
+    )
+
+
+def _serve(args):
+    import logging
+    import signal
+    import sys
+    from . import server
+
+    logging.basicConfig(level=logging.INFO)
+    # exit normally on SIGTERM so the socket is removed
+    signal.signal(signal.SIGTERM, lambda *args: sys.exit(0))
+    server.serve(args.source, args.socket, watch=args.watch)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m sbu_sim")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    pack = subparsers.add_parser(
+        "pack", help="Write a reduced catalog to a packed dataset file."
+    )
+    pack.add_argument("catalog", help="The name of the reduced TiCu catalog")
+    pack.add_argument("output", help="The file to write")
+    pack.add_argument(
+        "--peaks",
+        type=float,
+        nargs="+",
+        default=None,
+        help="The peak locations to reduce (default: ticu.DEFAULT_PEAK_LOCATIONS)",
+    )
+    pack.add_argument(
+        "--dtype",
+        choices=["float64", "float32", "float16"],
+        default="float64",
+        help="The dtype to store the curves as (default: float64)",
+    )
+    pack.set_defaults(func=_pack)
+
+    serve = subparsers.add_parser(
+        "serve", help="Serve the simulated detectors' interpolation on a socket."
+    )
+    serve.add_argument(
+        "source", help="A packed dataset file or the name of a reduced TiCu catalog"
+    )
+    serve.add_argument(
+        "--socket",
+        default=None,
+        help="The Unix socket to listen on (default: server.default_socket_path())",
+    )
+    serve.add_argument(
+        "--watch",
+        type=float,
+        default=None,
+        metavar="SECONDS",
+        help="Check the catalog for new runs this often",
+    )
+    serve.set_defaults(func=_serve)
+
+    args = parser.parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,15 +1,18 @@
-"""Tools to integrate adaptive decsion making with Bluesky."""
+"""
+Tools to integrate adaptive decsion making with Bluesky.
+
+bluesky, ophyd, event_model and scipy are imported where they are used
+so that importing this module (e.g. for `warm_start` or the stop
+criteria in a worker process) only costs numpy.
+"""
 import uuid
+import time
 import itertools
-from queue import Queue
+from queue import Queue, Empty
 
 import numpy as np
 
-import bluesky.preprocessors as bpp
-import bluesky.plan_stubs as bps
-import bluesky.plans as bp
-
-from event_model import RunRouter, SingleRunDocumentRouter
+from . import trace
 
 
 def chain_zip(motors, next_point):
@@ -99,6 +102,557 @@ class StepAdaptive:
         return self.next_point
 
 
+def warm_start(adaptive_obj, independent, measurements):
+    """
+    Tell a recommendation engine about existing measurements in bulk.
+
+    If the engine has a ``tell_many`` method (as `adaptive.BaseLearner`
+    does) all of the data is passed in one call, otherwise it falls back
+    to calling ``tell`` once per point.
+
+    Parameters
+    ----------
+    adaptive_obj : adaptive.BaseLearner
+        The recommendation engine
+
+    independent : array
+        (N, n_independent) array of the measured positions
+
+    measurements : array
+        (N, n_dependent) array of the measured values
+
+    Returns
+    -------
+    adaptive_obj
+        The engine that was passed in.
+    """
+    tell_many = getattr(adaptive_obj, "tell_many", None)
+    if tell_many is not None:
+        tell_many(independent, measurements)
+    else:
+        for x, y in zip(independent, measurements):
+            adaptive_obj.tell(x, y)
+    return adaptive_obj
+
+
+# These are the policies the plans use to wait on the recommendation
+# engine.  They all provide a ``get(queue, last_point)`` method that
+# returns the next recommendation (a dict or `None`) or raises
+# `queue.Empty` if the scan should be aborted.
+
+#: Put this on the queue to tell a `Heartbeat` policy the engine is still working.
+HEARTBEAT = "__heartbeat__"
+
+
+def _is_heartbeat(item):
+    return isinstance(item, str) and item == HEARTBEAT
+
+
+class Deadline:
+    """Wait at most a fixed time for each recommendation."""
+
+    def __init__(self, timeout=1):
+        """
+
+        Any `HEARTBEAT` from the engine is ignored, it does not extend the
+        deadline.
+
+        Parameters
+        ----------
+        timeout : float, default 1
+            The maximum time, in seconds, to wait for a recommendation.
+
+        """
+        self.timeout = timeout
+
+    def get(self, queue, last_point):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            item = queue.get(timeout=max(deadline - time.monotonic(), 0))
+            if not _is_heartbeat(item):
+                return item
+
+
+class Heartbeat:
+    """Wait for the recommendation as long as the engine reports progress."""
+
+    def __init__(self, timeout=1, *, extension=None, max_wait=None):
+        """
+
+        Each time the engine puts `HEARTBEAT` on the queue the deadline is
+        pushed back by *extension* seconds.
+
+        Parameters
+        ----------
+        timeout : float, default 1
+            The time, in seconds, to wait for the first heartbeat or
+            recommendation.
+
+        extension : float, optional
+            How long each heartbeat extends the deadline by.  Defaults to
+            *timeout*.
+
+        max_wait : float, optional
+            A hard limit on the total time to wait, regardless of heartbeats.
+
+        """
+        self.timeout = timeout
+        self.extension = timeout if extension is None else extension
+        self.max_wait = max_wait
+
+    def get(self, queue, last_point):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        while True:
+            if self.max_wait is not None:
+                deadline = min(deadline, start + self.max_wait)
+            item = queue.get(timeout=max(deadline - time.monotonic(), 0))
+            if _is_heartbeat(item):
+                deadline = time.monotonic() + self.extension
+                continue
+            return item
+
+
+class Fallback:
+    """Wait a short time for the engine, then use a cheap recommender."""
+
+    def __init__(self, timeout, fallback):
+        """
+
+        Recommendations that arrive after the fallback has been used are
+        discarded so the plan and engine stay in step.
+
+        Parameters
+        ----------
+        timeout : float
+            The time, in seconds, to wait for the engine.
+
+        fallback : Callable[Dict[str, Any]] -> Dict[str, Any]
+            Given the last point measured, return the next point to measure.
+
+        """
+        self.timeout = timeout
+        self.fallback = fallback
+        self._stale = 0
+
+    def get(self, queue, last_point):
+        deadline = time.monotonic() + self.timeout
+        while True:
+            try:
+                item = queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except Empty:
+                self._stale += 1
+                return self.fallback(last_point)
+            if _is_heartbeat(item):
+                continue
+            if self._stale and item is not None:
+                self._stale -= 1
+                continue
+            return item
+
+
+def _get_recommendation(wait_policy, queue, last_point):
+    """Get the next point using *wait_policy*, returning it and the time waited."""
+    start = time.monotonic()
+    next_point = wait_policy.get(queue, last_point)
+    return next_point, time.monotonic() - start
+
+
+def _primary_only(callback):
+    """Wrap *callback* so it only sees the Events in the 'primary' stream."""
+    if getattr(callback, "primary_only", False):
+        return callback
+    primary = set()
+
+    def inner(name, doc):
+        if name == "descriptor" and doc.get("name", "primary") == "primary":
+            primary.add(doc["uid"])
+        elif name in ("event", "event_page") and doc["descriptor"] not in primary:
+            return
+        with trace.span(f"callback {name}", "callback"):
+            return callback(name, doc)
+
+    inner.primary_only = True
+    return inner
+
+
+class _SideStream:
+    """Record scalar book-keeping values as Events in a secondary stream."""
+
+    def __init__(self, name, keys):
+        from ophyd import Signal
+
+        self.name = name
+        self.signals = {k: Signal(name=f"{name}_{k}", value=0.0) for k in keys}
+
+    def record(self, **values):
+        import bluesky.plan_stubs as bps
+
+        for k, v in values.items():
+            # these are local soft signals, no need to go through the RunEngine
+            self.signals[k].put(v)
+        yield from bps.trigger_and_read(list(self.signals.values()), name=self.name)
+
+
+def _move_changed(target, positions, move_tolerance):
+    """
+    Move only the motors whose target differs from their last readback.
+
+    *positions* holds the last readback of each motor and is updated in
+    place with the readback of the motors that are moved, the motors that
+    are not moved stay where they were.  Returns the number of motors
+    that did not need to be moved.
+    """
+    import bluesky.plan_stubs as bps
+
+    if move_tolerance is None:
+        yield from bps.mov(*itertools.chain(*target.items()))
+        return 0
+    to_move = []
+    for m, value in target.items():
+        if isinstance(move_tolerance, dict):
+            tolerance = move_tolerance.get(m.name, 0)
+        else:
+            tolerance = move_tolerance
+        current = positions.get(m)
+        if current is None or np.any(np.abs(np.subtract(value, current)) > tolerance):
+            to_move.extend([m, value])
+    if to_move:
+        yield from bps.mov(*to_move)
+        for m in to_move[::2]:
+            positions[m] = yield from bps.rd(m)
+    return len(target) - len(to_move) // 2
+
+
+def _read_positions(motors):
+    """Read the current position of each motor, to seed `_move_changed`."""
+    import bluesky.plan_stubs as bps
+
+    positions = {}
+    for m in motors:
+        positions[m] = yield from bps.rd(m)
+    return positions
+
+
+# These are the stopping criteria the callbacks can evaluate after each
+# measurement, in addition to *max_count*.  They all provide a
+# ``should_stop(*, timestamp, independent, measurement, next_point, engine)``
+# method that returns True once the scan is no longer worth continuing,
+# and a ``reset()`` method to start over for a new engine.
+
+
+class TimeBudget:
+    """Stop once a fixed amount of time has been spent."""
+
+    def __init__(self, budget, *, virtual=False):
+        """
+
+        Parameters
+        ----------
+        budget : float
+            The time, in seconds, measured from the first measurement.
+
+        virtual : bool, default False
+            If True, use the timestamps on the Events rather than the wall
+            clock.  This is the time that matters for simulated data.
+
+        """
+        self.budget = budget
+        self.virtual = virtual
+        self.reset()
+
+    def reset(self):
+        self._start = None
+
+    def should_stop(self, *, timestamp, **kwargs):
+        now = timestamp if self.virtual else time.monotonic()
+        if self._start is None:
+            self._start = now
+        return now - self._start >= self.budget
+
+
+class UncertaintyPlateau:
+    """Stop once the engine's uncertainty stops improving."""
+
+    def __init__(self, uncertainty, *, rtol=1e-2, patience=3):
+        """
+
+        Parameters
+        ----------
+        uncertainty : Callable[engine] -> float
+            Extract the current (scalar) uncertainty from the engine, for
+            example ``lambda learner: learner.loss()``.
+
+        rtol : float, default 1e-2
+            The relative improvement below which a step counts as no progress.
+
+        patience : int, default 3
+            The number of consecutive steps without progress before stopping.
+
+        """
+        self.uncertainty = uncertainty
+        self.rtol = rtol
+        self.patience = patience
+        self.reset()
+
+    def reset(self):
+        self._last = None
+        self._stalled = 0
+
+    def should_stop(self, *, engine, **kwargs):
+        current = self.uncertainty(engine)
+        if self._last is not None:
+            if self._last - current <= self.rtol * abs(self._last):
+                self._stalled += 1
+            else:
+                self._stalled = 0
+        self._last = current
+        return self._stalled >= self.patience
+
+
+class MinStep:
+    """Stop once successive recommendations are closer than a threshold."""
+
+    def __init__(self, distance):
+        """
+
+        Parameters
+        ----------
+        distance : float
+            The minimum (Euclidean) distance between successive
+            recommendations that is worth measuring.
+
+        """
+        self.distance = distance
+        self.reset()
+
+    def reset(self):
+        self._last = None
+
+    def should_stop(self, *, next_point, **kwargs):
+        next_point = np.asarray(next_point, dtype=float)
+        last, self._last = self._last, next_point
+        if last is None:
+            return False
+        return np.linalg.norm(next_point - last) < self.distance
+
+
+def _should_stop(stop_criteria, **kwargs):
+    # evaluate all of them so they all see every point
+    return any([criterion.should_stop(**kwargs) for criterion in stop_criteria])
+
+
+class MeasurementCache:
+    """
+    Spatial index of the measurements taken so far.
+
+    When a recommendation is within *tolerance* of a point that has
+    already been measured the stored result is told back to the engine
+    instead of moving and measuring again.
+    """
+
+    def __init__(self, tolerance, *, max_reuse=100):
+        """
+
+        Parameters
+        ----------
+        tolerance : float or array[float]
+            The distance, per independent axis, within which two positions
+            are considered the same.  An axis with a tolerance of 0 must
+            match exactly.
+
+        max_reuse : int, default 100
+            The maximum number of cached results to tell the engine in a row
+            before measuring the recommendation anyway.
+
+        """
+        self.tolerance = np.asarray(tolerance, dtype=float)
+        self.max_reuse = max_reuse
+        self.reset()
+
+    def reset(self):
+        """Forget all of the measurements, and the hit count."""
+        # the values seen on each exact axis, numbered 2 apart so that
+        # different values are never within tolerance
+        self._codes = {}
+        self.hits = 0
+        self._positions = []
+        self._measurements = []
+        self._tree = None
+        self._n_indexed = 0
+        self._last_time = None
+        self._measure_time = 0
+        self._n_timed = 0
+
+    def __len__(self):
+        return len(self._positions)
+
+    @property
+    def time_saved(self):
+        """Estimate of the acquisition time saved, in seconds."""
+        if not self._n_timed:
+            return 0
+        return self.hits * self._measure_time / self._n_timed
+
+    def _scale(self, position, add):
+        """Scale *position* so that the tolerance is 1 on every axis."""
+        position = np.asarray(position, dtype=float)
+        tolerance = np.broadcast_to(self.tolerance, position.shape)
+        exact = tolerance == 0
+        scaled = np.divide(
+            position, tolerance, out=np.zeros_like(position), where=~exact
+        )
+        for j in np.flatnonzero(exact):
+            codes = self._codes.setdefault(j, {})
+            value = position[j]
+            if value not in codes:
+                if not add:
+                    # not within tolerance of anything seen
+                    scaled[j] = -2
+                    continue
+                codes[value] = 2 * len(codes)
+            scaled[j] = codes[value]
+        return scaled
+
+    def add(self, position, measurement, timestamp=None):
+        """Record a new measurement, and the time it was taken."""
+        self._positions.append(self._scale(position, add=True))
+        self._measurements.append(measurement)
+        if timestamp is not None:
+            if self._last_time is not None:
+                self._measure_time += timestamp - self._last_time
+                self._n_timed += 1
+            self._last_time = timestamp
+
+    def lookup(self, position):
+        """Return the measurement within tolerance of *position* or `None`."""
+        if not self._positions:
+            return None
+        target = self._scale(position, add=False)
+        # only re-build the tree once the un-indexed tail gets long,
+        # the tail is checked by brute force
+        if len(self._positions) - self._n_indexed > max(16, self._n_indexed // 4):
+            from scipy.spatial import cKDTree
+
+            self._tree = cKDTree(self._positions)
+            self._n_indexed = len(self._positions)
+        if self._tree is not None:
+            dist, indx = self._tree.query(target, p=np.inf)
+            if dist <= 1:
+                return self._measurements[indx]
+        tail = self._positions[self._n_indexed :]
+        if tail:
+            dist = np.abs(np.asarray(tail) - target).max(axis=1)
+            indx = np.argmin(dist)
+            if dist[indx] <= 1:
+                return self._measurements[self._n_indexed + indx]
+        return None
+
+
+#: The per-point timings, in seconds, that `LatencyLog` collects.
+LATENCY_KEYS = [
+    "move_time",
+    "read_time",
+    "dispatch_time",
+    "tell_time",
+    "ask_time",
+    "wait_time",
+]
+
+
+class LatencyLog:
+    """
+    Collect per-point timings from an adaptive plan and its callback.
+
+    Pass the same instance to the callback factory and to the plan.  The
+    callback records how long the Event took to reach it and how long the
+    engine took to tell and ask, the plan records how long the move,
+    acquisition and wait for the recommendation took.
+    """
+
+    def __init__(self):
+        self.records = []
+        self._pending = {}
+
+    def record(self, **timings):
+        """Add timings to the current point."""
+        self._pending.update(timings)
+
+    def commit(self):
+        """Finish the current point and return its timings."""
+        record = {k: self._pending.get(k, np.nan) for k in LATENCY_KEYS}
+        self.records.append(record)
+        self._pending = {}
+        return record
+
+    def arrays(self):
+        """Return the timings as a dict of arrays keyed on `LATENCY_KEYS`."""
+        return {k: np.array([r[k] for r in self.records]) for k in LATENCY_KEYS}
+
+
+def summarize_latency(timings, percentiles=(50, 90, 99)):
+    """
+    Summarize per-point timings as percentiles.
+
+    Parameters
+    ----------
+    timings : LatencyLog or Mapping[str, array[float]]
+        The timings, for example from a `LatencyLog` or the data in the
+        ``'adaptive'`` stream written by `per_event_adaptive_plan`, e.g.
+        ``run.adaptive.read()``.
+
+    percentiles : List[float], default (50, 90, 99)
+        The percentiles to compute.
+
+    Returns
+    -------
+    Dict[str, Dict[float, float]]
+        For each of `LATENCY_KEYS` present, the requested percentiles in
+        seconds.  Points where a timing was not measured are ignored.
+    """
+    if isinstance(timings, LatencyLog):
+        timings = timings.arrays()
+    out = {}
+    for key in LATENCY_KEYS:
+        for name in (key, f"adaptive_{key}"):
+            if name in timings:
+                values = np.asarray(timings[name], dtype=float)
+                values = values[np.isfinite(values)]
+                out[key] = {
+                    p: np.percentile(values, p) if len(values) else np.nan
+                    for p in percentiles
+                }
+                break
+    return out
+
+
+def _timed_tell_ask(adaptive_obj, independent, measurement, latency):
+    """Tell the engine about a measurement and ask for the next point."""
+    start = time.monotonic()
+    with trace.span("tell", "engine"):
+        adaptive_obj.tell(independent, measurement)
+    told = time.monotonic()
+    with trace.span("ask", "engine"):
+        next_point = adaptive_obj.ask(1)
+    if latency is not None:
+        latency.record(tell_time=told - start, ask_time=time.monotonic() - told)
+    return next_point
+
+
+def _reuse_cached(adaptive_obj, cache, next_point):
+    """Tell the engine cached results until it recommends a new position."""
+    if cache is None:
+        return next_point
+    for _ in range(cache.max_reuse):
+        measurement = cache.lookup(next_point)
+        if measurement is None:
+            break
+        cache.hits += 1
+        adaptive_obj.tell(np.asarray(next_point), measurement)
+        next_point = adaptive_obj.ask(1)
+    return next_point
+
+
 # These tools are for integrating the adaptive logic inside of a run.
 # They are expected to get single events and provide feedback to drive
 # the plan based in that information.  This is useful when the computation
@@ -109,7 +663,13 @@ class StepAdaptive:
 
 
 def per_event_plan_sequence_factory(
-    sequence, independent_keys, dependent_keys, *, max_count=10, queue=None
+    sequence,
+    independent_keys,
+    dependent_keys,
+    *,
+    max_count=10,
+    queue=None,
+    stop_criteria=()
 ):
     """
     Generate the callback and queue for a naive recommendation engine.
@@ -143,6 +703,10 @@ def per_event_plan_sequence_factory(
         The communication channel for the callback to feedback to the plan.
         If not given, a new queue will be created.
 
+    stop_criteria : List[TimeBudget or UncertaintyPlateau or MinStep], optional
+        Additional criteria evaluated after each measurement.  The queue is
+        poisoned as soon as any of them is met.
+
     Returns
     -------
     callback : Callable[str, dict]
@@ -171,13 +735,29 @@ def per_event_plan_sequence_factory(
             measurement = np.asarray([payload[k] for k in dependent_keys])
             # call something to get next point!
             next_point = next(seq)
+            if _should_stop(
+                stop_criteria,
+                timestamp=doc["time"],
+                independent=inp,
+                measurement=measurement,
+                next_point=next_point,
+                engine=None,
+            ):
+                queue.put(None)
+                return
             queue.put({k: v for k, v in zip(independent_keys, next_point)})
 
-    return callback, queue
+    return _primary_only(callback), queue
 
 
 def per_event_plan_step_factory(
-    step, independent_keys, dependent_keys, *, max_count=10, queue=None
+    step,
+    independent_keys,
+    dependent_keys,
+    *,
+    max_count=10,
+    queue=None,
+    stop_criteria=()
 ):
     """
     Generate the callback and queue for a naive recommendation engine.
@@ -210,6 +790,10 @@ def per_event_plan_step_factory(
         The communication channel for the callback to feedback to the plan.
         If not given, a new queue will be created.
 
+    stop_criteria : List[TimeBudget or UncertaintyPlateau or MinStep], optional
+        Additional criteria evaluated after each measurement.  The queue is
+        poisoned as soon as any of them is met.
+
     Returns
     -------
     callback : Callable[str, dict]
@@ -239,14 +823,34 @@ def per_event_plan_step_factory(
             measurement = np.asarray([payload[k][-1] for k in dependent_keys])
             # call something to get next point!
             next_point = independent + step
+            if _should_stop(
+                stop_criteria,
+                timestamp=doc["time"][-1],
+                independent=independent,
+                measurement=measurement,
+                next_point=next_point,
+                engine=None,
+            ):
+                queue.put(None)
+                return
             queue.put({k: v for k, v in zip(independent_keys, next_point)})
 
-    rr = RunRouter([lambda name, doc: ([callback], [])])
+    from event_model import RunRouter
+
+    rr = RunRouter([lambda name, doc: ([_primary_only(callback)], [])])
     return rr, queue
 
 
 def per_event_plan_gpcam_factory(
-    gpcam_object, independent_keys, dependent_keys, *, max_count=10, queue=None
+    gpcam_object,
+    independent_keys,
+    dependent_keys,
+    *,
+    max_count=10,
+    queue=None,
+    stop_criteria=(),
+    cache=None,
+    latency=None
 ):
     """
     Generate the callback and queue for gpCAM integration.
@@ -277,6 +881,19 @@ def per_event_plan_gpcam_factory(
         The communication channel for the callback to feedback to the plan.
         If not given, a new queue will be created.
 
+    stop_criteria : List[TimeBudget or UncertaintyPlateau or MinStep], optional
+        Additional criteria evaluated after each measurement.  The queue is
+        poisoned as soon as any of them is met.
+
+    cache : MeasurementCache, optional
+        If given, every measurement is added to it and recommendations
+        within its tolerance of an existing measurement are answered from
+        it rather than being sent to the plan.
+
+    latency : LatencyLog, optional
+        If given, record how long each Event took to arrive and how long
+        the engine took to tell and ask.
+
     Returns
     -------
     callback : Callable[str, dict]
@@ -294,6 +911,8 @@ def per_event_plan_gpcam_factory(
     # TODO handle multi-stream runs!
     def callback(name, doc):
         if name == "event_page":
+            if latency is not None:
+                latency.record(dispatch_time=time.time() - doc["time"][-1])
             if doc["seq_num"][-1] > max_count:
                 # if at max number of points poison the queue and return early
                 queue.put(None)
@@ -305,12 +924,28 @@ def per_event_plan_gpcam_factory(
             measurement = np.asarray([payload[k][-1] for k in dependent_keys])
             # call something to get next point!
             # # GPCAM CODE GOES HERE
-            gpcam_object.tell(independent, measurement)
-            next_point = gpcam_object.ask(1)
+            next_point = _timed_tell_ask(gpcam_object, independent, measurement, latency)
+            if cache is not None:
+                cache.add(independent, measurement, doc["time"][-1])
+                next_point = _reuse_cached(gpcam_object, cache, next_point)
             # # GPCAM CODE GOES HERE
+            if _should_stop(
+                stop_criteria,
+                timestamp=doc["time"][-1],
+                independent=independent,
+                measurement=measurement,
+                next_point=next_point,
+                engine=gpcam_object,
+            ):
+                queue.put(None)
+                return
             queue.put({k: v for k, v in zip(independent_keys, next_point)})
 
-    return callback, queue
+    from event_model import RunRouter
+
+    # the RunRouter re-packs the Events from the RunEngine as event_page
+    rr = RunRouter([lambda name, doc: ([_primary_only(callback)], [])])
+    return rr, queue
 
 
 def per_event_adaptive_plan(
@@ -320,7 +955,10 @@ def per_event_adaptive_plan(
     to_brains,
     from_brains,
     md=None,
-    take_reading=bps.trigger_and_read
+    take_reading=None,
+    wait_policy=None,
+    move_tolerance=0,
+    latency=None
 ):
     """
     Execute an adaptive scan using an per event-run recommendation engine.
@@ -344,8 +982,10 @@ def per_event_adaptive_plan(
     to_brains : Callable[str, dict]
        This is the callback that will be registered to the RunEngine.
 
-       The expected contract is for each event it will place either a
-       dict mapping independent variable to recommended value or None.
+       The expected contract is for each primary Event it will place
+       either a dict mapping independent variable to recommended value
+       or None.  The Events of the ``'adaptive'`` stream are not passed
+       to it.
 
        This plan will either move to the new position and take data
        if the value is a dict or end the run if `None`
@@ -365,8 +1005,38 @@ def per_event_adaptive_plan(
 
         Callable[List[OphydObj], Optional[str]] -> Generator[Msg], optional
 
-        Defaults to `trigger_and_read`
+        Defaults to `bluesky.plan_stubs.trigger_and_read`
+
+    wait_policy : Deadline or Heartbeat or Fallback, optional
+        How to wait on *from_brains* for each recommendation.  The time
+        spent waiting for each recommendation is recorded in the
+        ``'adaptive'`` stream.
+
+        Defaults to ``Deadline(1)``
+
+    move_tolerance : float or Dict[str, float] or None, optional
+        Motors already within this distance of their target (globally or
+        per motor name) are not moved.  The number of motors not moved at
+        each point is recorded in the ``'adaptive'`` stream.  If `None`,
+        always move every motor.
+
+        Defaults to 0, only skip moves to exactly the current position.
+
+    latency : LatencyLog, optional
+        Where to collect the per-point timings.  Pass the same object to
+        the callback factory to also get the callback and engine timings.
+        The timings of each point are recorded in the ``'adaptive'``
+        stream, see `summarize_latency`.
     """
+    import bluesky.preprocessors as bpp
+    import bluesky.plan_stubs as bps
+
+    if take_reading is None:
+        take_reading = bps.trigger_and_read
+    if wait_policy is None:
+        wait_policy = Deadline(1)
+    if latency is None:
+        latency = LatencyLog()
     # TODO inject args / kwargs here.
     _md = {"hints": {}}
     _md.update(md or {})
@@ -383,17 +1053,36 @@ def per_event_adaptive_plan(
     # from queue
     first_point = {m.name: v for m, v in first_point.items()}
 
-    @bpp.subs_decorator(to_brains)
+    stats = _SideStream("adaptive", ["moves_skipped"] + LATENCY_KEYS)
+
+    # the recommendation engine only expects the primary Events
+    @bpp.subs_decorator(_primary_only(to_brains))
     @bpp.run_decorator(md=_md)
     def gp_inner_plan():
+        positions = {}
+        if move_tolerance is not None:
+            positions = yield from _read_positions(motors)
         next_point = first_point
         while True:
             # this assumes that m.name == the key in Event
             target = {m: next_point[m.name] for m in motors}
-            motor_position_pairs = itertools.chain(*target.items())
-            yield from bps.mov(*motor_position_pairs)
-            yield from take_reading(dets + motors, name='primary')
-            next_point = from_brains.get(timeout=1)
+            start = time.monotonic()
+            with trace.span("move", "plan"):
+                moves_skipped = yield from _move_changed(
+                    target, positions, move_tolerance
+                )
+            moved = time.monotonic()
+            with trace.span("read", "plan"):
+                yield from take_reading(dets + motors, name='primary')
+            read = time.monotonic()
+            with trace.span("wait", "plan"):
+                next_point, wait_time = _get_recommendation(
+                    wait_policy, from_brains, next_point
+                )
+            latency.record(
+                move_time=moved - start, read_time=read - moved, wait_time=wait_time
+            )
+            yield from stats.record(moves_skipped=moves_skipped, **latency.commit())
             if next_point is None:
                 return
 
@@ -413,7 +1102,13 @@ def per_event_adaptive_plan(
 
 
 def per_start_step_factory(
-    step, independent_keys, dependent_keys, *, max_count=10, queue=None
+    step,
+    independent_keys,
+    dependent_keys,
+    *,
+    max_count=10,
+    queue=None,
+    stop_criteria=()
 ):
     """
     Generate the callback and queue for a naive recommendation engine.
@@ -449,6 +1144,10 @@ def per_start_step_factory(
         The communication channel for the callback to feedback to the plan.
         If not given, a new queue will be created.
 
+    stop_criteria : List[TimeBudget or UncertaintyPlateau or MinStep], optional
+        Additional criteria evaluated after each measurement.  The queue is
+        poisoned as soon as any of them is met.
+
     Returns
     -------
     callback : Callable[str, dict]
@@ -479,14 +1178,34 @@ def per_start_step_factory(
             measurement = np.asarray([payload[k][-1] for k in dependent_keys])
             # call something to get next point!
             next_point = independent + step
+            if _should_stop(
+                stop_criteria,
+                timestamp=doc["time"][-1],
+                independent=independent,
+                measurement=measurement,
+                next_point=next_point,
+                engine=None,
+            ):
+                queue.put(None)
+                return
             queue.put({k: v for k, v in zip(independent_keys, next_point)})
 
-    rr = RunRouter([lambda name, doc: ([callback], [])])
+    from event_model import RunRouter
+
+    rr = RunRouter([lambda name, doc: ([_primary_only(callback)], [])])
     return rr, queue
 
 
 def per_start_adaptive_factory(
-    adaptive_obj, independent_keys, dependent_keys, *, max_count=10, queue=None
+    adaptive_obj,
+    independent_keys,
+    dependent_keys,
+    *,
+    max_count=10,
+    queue=None,
+    stop_criteria=(),
+    cache=None,
+    latency=None
 ):
     """
     Generate the callback and queue for an Adaptive API backed reccomender.
@@ -522,6 +1241,19 @@ def per_start_adaptive_factory(
         The communication channel for the callback to feedback to the plan.
         If not given, a new queue will be created.
 
+    stop_criteria : List[TimeBudget or UncertaintyPlateau or MinStep], optional
+        Additional criteria evaluated after each measurement.  The queue is
+        poisoned as soon as any of them is met.
+
+    cache : MeasurementCache, optional
+        If given, every measurement is added to it and recommendations
+        within its tolerance of an existing measurement are answered from
+        it rather than being sent to the plan.
+
+    latency : LatencyLog, optional
+        If given, record how long each Event took to arrive and how long
+        the engine took to tell and ask.
+
     Returns
     -------
     callback : Callable[str, dict]
@@ -545,23 +1277,47 @@ def per_start_adaptive_factory(
                 return
 
         if name == "event_page":
+            if latency is not None:
+                latency.record(dispatch_time=time.time() - doc["time"][-1])
             payload = doc["data"]
             # This is your "motor positions"
             independent = np.asarray([payload[k][-1] for k in independent_keys])
             # This is the extracted measurements
             measurement = np.asarray([payload[k][-1] for k in dependent_keys])
-            # push into the adaptive API
-            adaptive_obj.tell(independent, measurement)
-            # pull the next point out of the adaptive API
-            next_point = adaptive_obj.ask(1)
+            # push into the adaptive API and pull the next point out
+            next_point = _timed_tell_ask(adaptive_obj, independent, measurement, latency)
+            if cache is not None:
+                cache.add(independent, measurement, doc["time"][-1])
+                next_point = _reuse_cached(adaptive_obj, cache, next_point)
+            if _should_stop(
+                stop_criteria,
+                timestamp=doc["time"][-1],
+                independent=independent,
+                measurement=measurement,
+                next_point=next_point,
+                engine=adaptive_obj,
+            ):
+                queue.put(None)
+                return
             queue.put({k: v for k, v in zip(independent_keys, next_point)})
 
-    rr = RunRouter([lambda name, doc: ([callback], [])])
+    from event_model import RunRouter
+
+    rr = RunRouter([lambda name, doc: ([_primary_only(callback)], [])])
     return rr, queue
 
 
 def per_start_adaptive_factory_factory(
-    adaptive_factory, independent_keys, dependent_keys, *, max_count=10, queue=None
+    adaptive_factory,
+    independent_keys,
+    dependent_keys,
+    *,
+    max_count=10,
+    queue=None,
+    stop_criteria=(),
+    prior=None,
+    cache=None,
+    latency=None
 ):
     """
     Generate the callback and queue for a naive recommendation engine.
@@ -598,6 +1354,26 @@ def per_start_adaptive_factory_factory(
         The communication channel for the callback to feedback to the plan.
         If not given, a new queue will be created.
 
+    stop_criteria : List[TimeBudget or UncertaintyPlateau or MinStep], optional
+        Additional criteria evaluated after each measurement.  The queue is
+        poisoned as soon as any of them is met.  They are reset whenever a
+        new batch starts a new engine.
+
+    prior : Tuple[array, array], optional
+        The (independent, measurements) arrays of existing data, for example
+        from `sbu_sim.ticu.reduce_catalog`.  Each new engine is warm started
+        with these via `warm_start`.
+
+    cache : MeasurementCache, optional
+        If given, every measurement is added to it and recommendations
+        within its tolerance of an existing measurement are answered from
+        it rather than being sent to the plan.  It is reset whenever a new
+        batch starts a new engine, as the new engine knows none of it.
+
+    latency : LatencyLog, optional
+        If given, record how long each Event took to arrive and how long
+        the engine took to tell and ask.
+
     Returns
     -------
     callback : Callable[str, dict]
@@ -627,25 +1403,55 @@ def per_start_adaptive_factory_factory(
             if last_batch_id != doc['batch_id']:
                 last_batch_id = doc['batch_id']
                 adaptive_obj = adaptive_factory(doc)
+                if prior is not None:
+                    warm_start(adaptive_obj, *prior)
+                for criterion in stop_criteria:
+                    criterion.reset()
+                if cache is not None:
+                    cache.reset()
 
         if name == "event_page":
+            if latency is not None:
+                latency.record(dispatch_time=time.time() - doc["time"][-1])
             payload = doc["data"]
             # This is your "motor positions"
             independent = np.asarray([payload[k][-1] for k in independent_keys])
             # This is the extracted measurements
             measurement = np.asarray([payload[k][-1] for k in dependent_keys])
-            # push into the adaptive API
-            adaptive_obj.tell(independent, measurement)
-            # pull the next point out of the adaptive API
-            next_point = adaptive_obj.ask(1)
+            # push into the adaptive API and pull the next point out
+            next_point = _timed_tell_ask(adaptive_obj, independent, measurement, latency)
+            if cache is not None:
+                cache.add(independent, measurement, doc["time"][-1])
+                next_point = _reuse_cached(adaptive_obj, cache, next_point)
+            if _should_stop(
+                stop_criteria,
+                timestamp=doc["time"][-1],
+                independent=independent,
+                measurement=measurement,
+                next_point=next_point,
+                engine=adaptive_obj,
+            ):
+                queue.put(None)
+                return
             queue.put({k: v for k, v in zip(independent_keys, next_point)})
 
-    rr = RunRouter([lambda name, doc: ([callback], [])])
+    from event_model import RunRouter
+
+    rr = RunRouter([lambda name, doc: ([_primary_only(callback)], [])])
     return rr, queue
 
 
 def per_start_adaptive_plan(
-    dets, first_point, *, to_brains, from_brains, md=None, take_reading=bp.count
+    dets,
+    first_point,
+    *,
+    to_brains,
+    from_brains,
+    md=None,
+    take_reading=None,
+    wait_policy=None,
+    move_tolerance=0,
+    latency=None
 ):
     """
     Execute an adaptive scan using an inter-run recommendation engine.
@@ -687,10 +1493,43 @@ def per_start_adaptive_plan(
 
         Callable[List[OphydObj], Optional[Dict[str, Any]]] -> Generator[Msg], optional
 
-        This plan must generate exactly 1 Run
+        This plan must generate exactly 1 Run.  The next recommendation
+        is waited for just before the Run is closed.
+
+        Defaults to `bluesky.plans.count`
+
+    wait_policy : Deadline or Heartbeat or Fallback, optional
+        How to wait on *from_brains* for each recommendation.  The time
+        spent waiting for the recommendation that produced each Run is
+        recorded as ``'wait_time'`` in its Start document.
 
-        Defaults to `bp.count`
+        Defaults to ``Deadline(1)``
+
+    move_tolerance : float or Dict[str, float] or None, optional
+        Motors already within this distance of their target (globally or
+        per motor name) are not moved.  The number of motors not moved
+        before each Run is recorded as ``'moves_skipped'`` in its Start
+        document.  If `None`, always move every motor.
+
+        Defaults to 0, only skip moves to exactly the current position.
+
+    latency : LatencyLog, optional
+        Where to collect the per-Run timings.  Pass the same object to
+        the callback factory to also get the callback and engine timings.
+        The timings of each point, and the number of motors not moved,
+        are recorded in an ``'adaptive'`` stream of its Run, and again
+        as ``'latency'`` in the Start document of the next Run (`None`
+        where not measured), see `summarize_latency`.
     """
+    import bluesky.preprocessors as bpp
+    import bluesky.plans as bp
+
+    if take_reading is None:
+        take_reading = bp.count
+    if wait_policy is None:
+        wait_policy = Deadline(1)
+    if latency is None:
+        latency = LatencyLog()
     # extract the motors
     motors = list(first_point.keys())
     # convert the first_point variable to from we will be getting
@@ -701,20 +1540,75 @@ def per_start_adaptive_plan(
 
     _md.update(md or {})
 
-    @bpp.subs_decorator(to_brains)
+    stats = _SideStream("adaptive", ["moves_skipped"] + LATENCY_KEYS)
+
+    # the recommendation engine only expects the primary Events
+    @bpp.subs_decorator(_primary_only(to_brains))
     def gp_inner_plan():
         uids = []
+        positions = {}
+        if move_tolerance is not None:
+            positions = yield from _read_positions(motors)
         next_point = first_point
+        wait_time = 0
+        # the timings of the previous point, the first Run has none
+        previous = {}
         for j in itertools.count():
             # this assumes that m.name == the key in Event
             target = {m: next_point[m.name] for m in motors}
-            motor_position_pairs = itertools.chain(*target.items())
-
-            yield from bps.mov(*motor_position_pairs)
-            uid = yield from take_reading(dets + motors, md={**_md, "batch_count": j})
+            start = time.monotonic()
+            with trace.span("move", "plan"):
+                moves_skipped = yield from _move_changed(
+                    target, positions, move_tolerance
+                )
+            moved = time.monotonic()
+            point = {}
+
+            def finish_point(msg):
+                # the recommendation is made from the Events, so wait for
+                # it and record the timings while the Run is still open
+                if msg.command != "close_run":
+                    return None, None
+
+                def record():
+                    read = time.monotonic()
+                    with trace.span("wait", "plan"):
+                        point["next"], point["wait"] = _get_recommendation(
+                            wait_policy, from_brains, next_point
+                        )
+                    latency.record(
+                        move_time=moved - start,
+                        read_time=read - moved,
+                        wait_time=point["wait"],
+                    )
+                    point["latency"] = latency.commit()
+                    yield from stats.record(
+                        moves_skipped=moves_skipped, **point["latency"]
+                    )
+                    return (yield msg)
+
+                return record(), None
+
+            with trace.span("read", "plan"):
+                uid = yield from bpp.plan_mutator(
+                    take_reading(
+                        dets + motors,
+                        md={
+                            **_md,
+                            "batch_count": j,
+                            "wait_time": wait_time,
+                            "moves_skipped": moves_skipped,
+                            "latency": previous,
+                        },
+                    ),
+                    finish_point,
+                )
             uids.append(uid)
-
-            next_point = from_brains.get(timeout=1)
+            next_point, wait_time = point["next"], point["wait"]
+            previous = {
+                k: None if np.isnan(v) else float(v)
+                for k, v in point["latency"].items()
+            }
             if next_point is None:
                 return
 
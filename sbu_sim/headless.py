@@ -0,0 +1,121 @@
+"""Run adaptive campaigns directly against the interpolation, without a RunEngine."""
+import time
+
+import numpy as np
+
+from .adaptive_integration import _should_stop
+
+
+def run_campaigns(engines, core, first_points, *, max_count=10, stop_criteria=None):
+    """
+    Run several independent adaptive campaigns in lock step.
+
+    At each step the current point of every campaign that is still
+    running is evaluated in one batched call to *core*.
+
+    The sequence of measurements is the same as running
+    `per_event_adaptive_plan` with the callback from
+    `per_event_plan_gpcam_factory` against the ticu devices: each engine
+    is told about and asked for a new point after each of the first
+    *max_count* measurements and one final measurement is taken at the
+    last recommendation.
+
+    Parameters
+    ----------
+    engines : List[ask / tell object]
+        The recommendation engines, for example `StepAdaptive`
+
+    core : Callable[array[float]] -> array[float]
+        Maps a (K, 3) array of positions to a (K, M) array of measurements,
+        typically a `sbu_sim.ticu.InterpolationCore`
+
+    first_points : array[float]
+        (len(engines), 3) array of the first position of each campaign
+
+    max_count : int, optional
+        The maximum number of recommendations to ask each engine for.
+
+    stop_criteria : List[List[TimeBudget or UncertaintyPlateau or MinStep]], optional
+        The additional stopping criteria for each campaign.
+
+    Returns
+    -------
+    List[Tuple[array[float], array[float]]]
+        The (x, y) history of each campaign.
+    """
+    if stop_criteria is None:
+        stop_criteria = [()] * len(engines)
+    history = [([], []) for _ in engines]
+    active = list(range(len(engines)))
+    points = np.asarray(first_points, dtype=float)
+    for seq_num in range(1, max_count + 2):
+        measurements = np.atleast_2d(core(points))
+        next_active = []
+        next_points = []
+        for j, x, y in zip(active, points, measurements):
+            history[j][0].append(x)
+            history[j][1].append(y)
+            if seq_num > max_count:
+                continue
+            engine = engines[j]
+            engine.tell(x, y)
+            next_point = np.asarray(engine.ask(1), dtype=float)
+            if _should_stop(
+                stop_criteria[j],
+                timestamp=time.time(),
+                independent=x,
+                measurement=y,
+                next_point=next_point,
+                engine=engine,
+            ):
+                continue
+            next_active.append(j)
+            next_points.append(next_point)
+        if not next_active:
+            break
+        active = next_active
+        points = np.asarray(next_points)
+
+    return [(np.asarray(x), np.asarray(y)) for x, y in history]
+
+
+def run_campaign(engine, core, first_point, *, max_count=10, stop_criteria=()):
+    """
+    Run a single adaptive campaign directly against the interpolation.
+
+    See `run_campaigns` for details.
+
+    Parameters
+    ----------
+    engine : ask / tell object
+        The recommendation engine, for example `StepAdaptive`
+
+    core : Callable[array[float]] -> array[float]
+        Maps a (K, 3) array of positions to a (K, M) array of measurements,
+        typically a `sbu_sim.ticu.InterpolationCore`
+
+    first_point : array[float]
+        The (Ti, anneal_time, temp) to start at
+
+    max_count : int, optional
+        The maximum number of recommendations to ask the engine for.
+
+    stop_criteria : List[TimeBudget or UncertaintyPlateau or MinStep], optional
+        Additional stopping criteria.
+
+    Returns
+    -------
+    x : array[float]
+        (n, 3) array of the positions measured
+
+    y : array[float]
+        (n, M) array of the measurements
+    """
+    (ret,) = run_campaigns(
+        [engine],
+        core,
+        [first_point],
+        max_count=max_count,
+        stop_criteria=[stop_criteria],
+    )
+    return ret
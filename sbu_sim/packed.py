@@ -0,0 +1,386 @@
+"""
+A single file format for the simulation dataset that needs no databroker.
+
+The file is::
+
+    b"SBUSIMPK"             8 byte magic
+    version                 uint32, little endian
+    header length           uint64, little endian
+    header                  utf-8 JSON
+    arrays                  raw C-ordered arrays, each 64 byte aligned
+
+The header records the dtype, shape and offset of each array along with
+the peak locations and provenance.  The arrays are memory-mapped on load
+so opening even a very large file is nearly free.
+
+The file may also hold the Delaunay triangulation of the coordinates, as
+the arrays named ``tri.*``.  Every process that loads such a file shares
+one copy of the data and the triangulation through the page cache, see
+`publish`.
+"""
+import datetime
+import json
+import os
+import struct
+import tempfile
+import uuid
+
+import numpy as np
+
+from . import ticu
+
+MAGIC = b"SBUSIMPK"
+VERSION = 1
+_PREAMBLE = struct.Struct("<8sIQ")
+_ALIGN = 64
+
+
+def _aligned(offset):
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+_TRI_PREFIX = "tri."
+
+
+def _layout(specs, peak_locations, provenance, triangulation=None):
+    """
+    Make the header for arrays with the given (dtype, shape).
+
+    Returns the encoded header and the total file size.
+    """
+    from . import __version__
+
+    header = {
+        "arrays": {
+            name: {"dtype": np.dtype(dtype).str, "shape": list(shape), "offset": 0}
+            for name, (dtype, shape) in specs.items()
+        },
+        "peak_locations": (
+            None if peak_locations is None else [float(p) for p in peak_locations]
+        ),
+        "provenance": {
+            **provenance,
+            "packed": datetime.datetime.now().isoformat(),
+            "sbu_sim_version": __version__,
+        },
+    }
+    if triangulation is not None:
+        header["triangulation"] = triangulation
+    # the offsets depend on the header length, which depends on the
+    # offsets, so reserve plenty of room for the digits
+    reserved = len(json.dumps(header).encode()) + 32 * len(specs) + 64
+    offset = _aligned(_PREAMBLE.size + reserved)
+    for spec in header["arrays"].values():
+        spec["offset"] = offset
+        nbytes = np.dtype(spec["dtype"]).itemsize * int(np.prod(spec["shape"]))
+        offset = _aligned(offset + nbytes)
+    return header, json.dumps(header).encode().ljust(reserved), offset
+
+
+def _write_header(fout, header_bytes, size):
+    fout.write(_PREAMBLE.pack(MAGIC, VERSION, len(header_bytes)))
+    fout.write(header_bytes)
+    fout.truncate(size)
+
+
+def _triangulation_state(dataset):
+    """
+    Split the state of the triangulation of *dataset* into arrays and scalars.
+
+    The points are not stored again, they are the coordinates.
+    """
+    import scipy
+    import scipy.spatial
+
+    tri = dataset.triangulation
+    if tri is None:
+        tri = scipy.spatial.Delaunay(np.asarray(dataset.coords, dtype=float))
+    # computed lazily, store it so no process has to
+    tri.transform
+    arrays, scalars = {}, {}
+    for key, value in tri.__getstate__().items():
+        if key == "_points" or value is None:
+            continue
+        if isinstance(value, np.ndarray):
+            arrays[_TRI_PREFIX + key] = value
+        else:
+            scalars[key] = value.item() if isinstance(value, np.generic) else value
+    return arrays, {"scipy_version": scipy.__version__, "state": scalars}
+
+
+def _load_triangulation(header, arrays):
+    """Rebuild the triangulation stored in a packed file, if there is one."""
+    import scipy
+    import scipy.spatial
+
+    info = header.get("triangulation")
+    if info is None:
+        return None
+    if info["scipy_version"] != scipy.__version__:
+        # the internals of Delaunay may differ, triangulate again instead
+        return None
+    tri = scipy.spatial.Delaunay.__new__(scipy.spatial.Delaunay)
+    tri.__dict__.update(
+        info["state"],
+        _points=arrays["coords"],
+        **{
+            name[len(_TRI_PREFIX) :]: arr
+            for name, arr in arrays.items()
+            if name.startswith(_TRI_PREFIX)
+        },
+    )
+    return tri
+
+
+def save(dataset, path, *, provenance=None, triangulation=False):
+    """
+    Write a `SimDataset` to a packed file.
+
+    Parameters
+    ----------
+    dataset : SimDataset
+        The data to write
+
+    path : str
+        The file to write
+
+    provenance : dict, optional
+        Added to the dataset's provenance in the file
+
+    triangulation : bool, default False
+        If True also store the triangulation of the coordinates, so
+        loading the file does not need to compute it.
+    """
+    arrays = {
+        "coords": np.asarray(dataset.coords, dtype=float),
+        "I": np.asarray(dataset.I),
+        "Q": np.asarray(dataset.Q, dtype=float),
+    }
+    if dataset.rois is not None:
+        arrays["rois"] = np.asarray(dataset.rois)
+    if dataset.uids is not None:
+        arrays["uids"] = np.asarray(dataset.uids, dtype="S")
+    tri_info = None
+    if triangulation:
+        tri_arrays, tri_info = _triangulation_state(dataset)
+        arrays.update(tri_arrays)
+
+    header, header_bytes, size = _layout(
+        {name: (arr.dtype, arr.shape) for name, arr in arrays.items()},
+        dataset.peak_locations,
+        {**dataset.provenance, **(provenance or {})},
+        tri_info,
+    )
+    with open(path, "wb") as fout:
+        _write_header(fout, header_bytes, size)
+        for name, arr in arrays.items():
+            fout.seek(header["arrays"][name]["offset"])
+            fout.write(np.ascontiguousarray(arr).data)
+    return path
+
+
+def read_header(path):
+    """Return the JSON header of a packed file."""
+    with open(path, "rb") as fin:
+        magic, version, length = _PREAMBLE.unpack(fin.read(_PREAMBLE.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a packed sbu_sim dataset")
+        if version > VERSION:
+            raise ValueError(
+                f"{path} is version {version}, this sbu_sim only reads up to {VERSION}"
+            )
+        return json.loads(fin.read(length))
+
+
+def load(path, *, mmap=True):
+    """
+    Load a `SimDataset` from a packed file.
+
+    Parameters
+    ----------
+    path : str
+        The file to read
+
+    mmap : bool, default True
+        If True the arrays are read-only memory maps of the file, otherwise
+        they are read into memory.  If the file holds a triangulation
+        (see `save`) it is memory-mapped too and used for the
+        interpolation.
+
+    Returns
+    -------
+    SimDataset
+    """
+    header = read_header(path)
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        shape = tuple(spec["shape"])
+        if mmap and np.prod(shape) > 0:
+            arrays[name] = np.memmap(
+                path, dtype=dtype, mode="r", offset=spec["offset"], shape=shape
+            )
+        else:
+            with open(path, "rb") as fin:
+                fin.seek(spec["offset"])
+                arrays[name] = np.fromfile(
+                    fin, dtype=dtype, count=int(np.prod(shape))
+                ).reshape(shape)
+    uids = arrays.get("uids")
+    return ticu.SimDataset(
+        arrays["coords"],
+        arrays["I"],
+        arrays["Q"],
+        rois=arrays.get("rois"),
+        peak_locations=header["peak_locations"],
+        uids=None if uids is None else [uid.decode() for uid in uids],
+        provenance={**header["provenance"], "path": os.fspath(path)},
+        triangulation=_load_triangulation(header, arrays),
+    )
+
+
+def publish(dataset, path=None, *, provenance=None):
+    """
+    Share a `SimDataset` and its triangulation between processes.
+
+    The dataset is written, with its triangulation, as a packed file in
+    shared memory (``/dev/shm`` where there is one).  Any process or
+    session on the machine can then `load` the file, or pass the path to
+    `sbu_sim.ticu.make_sim_devices`, and interpolate it without copying
+    the data or triangulating it again.  However many processes use it,
+    the dataset is in memory once.
+
+    The file is written under a temporary name and renamed into place,
+    so a process never sees a partially written dataset.  Remove the
+    file when it is no longer needed, memory in ``/dev/shm`` is only
+    freed when the file is deleted.
+
+    Parameters
+    ----------
+    dataset : SimDataset
+        The data to share
+
+    path : str, optional
+        Where to write the file.  Defaults to a new file in ``/dev/shm``,
+        or the temporary directory on systems without it.  A path on disk
+        keeps the dataset for later sessions.
+
+    provenance : dict, optional
+        Added to the dataset's provenance in the file
+
+    Returns
+    -------
+    str
+        The path of the file
+    """
+    if path is None:
+        directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+        path = os.path.join(directory, f"sbu_sim-{uuid.uuid4()}.sbusim")
+    path = os.fspath(path)
+    partial = f"{path}.{uuid.uuid4().hex[:8]}.partial"
+    try:
+        save(dataset, partial, provenance=provenance, triangulation=True)
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return path
+
+
+def pack_catalog(
+    cat,
+    path,
+    peak_locations=None,
+    *,
+    provenance=None,
+    q_grid=None,
+    grid_key=None,
+    chunk_size=256,
+    dtype=float,
+):
+    """
+    Extract the simulation inputs from a catalog and write a packed file.
+
+    The runs are read, reduced and written *chunk_size* at a time, so
+    the memory used does not depend on the size of the catalog.  Load
+    the file with `load` (or pass the path to
+    `sbu_sim.ticu.make_sim_devices`) to interpolate it without reading
+    it into memory.
+
+    Parameters
+    ----------
+    cat : Catalog
+        The reduced TiCu catalog
+
+    path : str
+        The file to write
+
+    peak_locations : array[float], optional
+        The ROIs to reduce, defaults to `sbu_sim.ticu.DEFAULT_PEAK_LOCATIONS`
+
+    provenance : dict, optional
+        Extra provenance to record, e.g. the catalog name
+
+    q_grid : array[float], optional
+        The Q grid to put all of the curves on.  Defaults to the grid of
+        the first run.
+
+    grid_key : Callable[[BlueskyRun], Hashable], optional
+        See `sbu_sim.ticu.load_dataset`
+
+    chunk_size : int, default 256
+        The number of runs to hold in memory at once
+
+    dtype : dtype, default float
+        The dtype to store the curves as, see `sbu_sim.ticu.load_dataset`
+    """
+    if peak_locations is None:
+        peak_locations = ticu.DEFAULT_PEAK_LOCATIONS
+    uids = list(cat)
+    if q_grid is None:
+        q_grid = ticu.read_fields(cat[uids[0]], ["Q"])["Q"]
+    q_grid = np.asarray(q_grid, dtype=float)
+    n = len(uids)
+    header, header_bytes, size = _layout(
+        {
+            "coords": (float, (n, 3)),
+            "I": (dtype, (n, len(q_grid))),
+            "Q": (float, q_grid.shape),
+            "rois": (float, (n, len(peak_locations))),
+            "uids": (f"S{max(len(uid) for uid in uids)}", (n,)),
+        },
+        peak_locations,
+        provenance or {},
+    )
+    with open(path, "wb") as fout:
+        _write_header(fout, header_bytes, size)
+
+    def array(name):
+        spec = header["arrays"][name]
+        return np.memmap(
+            path,
+            dtype=spec["dtype"],
+            mode="r+",
+            offset=spec["offset"],
+            shape=tuple(spec["shape"]),
+        )
+
+    coords, I, rois = array("coords"), array("I"), array("rois")
+    for start in range(0, n, chunk_size):
+        chunk = uids[start : start + chunk_size]
+        dataset = ticu.load_dataset(
+            {uid: cat[uid] for uid in chunk},
+            peak_locations,
+            q_grid=q_grid,
+            grid_key=grid_key,
+            dtype=dtype,
+        )
+        coords[start : start + len(chunk)] = dataset.coords
+        I[start : start + len(chunk)] = dataset.I
+        rois[start : start + len(chunk)] = dataset.rois
+    Q, packed_uids = array("Q"), array("uids")
+    Q[:] = q_grid
+    packed_uids[:] = uids
+    for arr in (coords, I, Q, rois, packed_uids):
+        arr.flush()
+    return path
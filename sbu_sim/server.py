@@ -0,0 +1,326 @@
+"""
+A long-lived local process serving the ticu interpolation over a Unix socket.
+
+Start it with ``python -m sbu_sim serve <catalog or packed file>``, then
+pass the socket path to `sbu_sim.ticu.make_sim_devices` as *server*.
+Setting up a session is then just connecting to the socket, and every
+RunEngine on the machine shares one warm interpolation.
+
+The protocol is a request and a response per call.  A request is::
+
+    b"SBUS"                 4 byte magic
+    version                 uint8
+    op                      uint8, one of INFO, FULL or ROIS
+    count                   uint32, little endian, the number of points
+    points                  count * 3 float64, little endian
+
+and a response is::
+
+    status                  uint8, 0 if ok otherwise an error
+    dtype                   3 bytes, the numpy dtype of the values or b"jsn"
+    generation              uint64, little endian
+    length                  uint64, little endian, the length of the payload
+    payload                 (count, M) values, JSON or the error message
+
+*generation* identifies the interpolation that answered, it changes
+whenever the server's data does, e.g. when new runs are picked up.  INFO
+returns the Q grid, the peak locations and the size of the dataset as
+JSON, with the generation of the full interpolation the Q grid belongs
+to.
+"""
+import json
+import logging
+import os
+import socket
+import socketserver
+import struct
+import tempfile
+import threading
+import types
+
+import numpy as np
+
+from . import packed
+from . import ticu
+from . import trace
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"SBUS"
+VERSION = 1
+INFO, FULL, ROIS = range(3)
+_REQUEST = struct.Struct("<4sBBI")
+_RESPONSE = struct.Struct("<B3sQQ")
+_JSON = b"jsn"
+
+
+def default_socket_path():
+    """The socket used if none is given, private to the user."""
+    directory = os.environ.get("XDG_RUNTIME_DIR") or tempfile.gettempdir()
+    return os.path.join(directory, f"sbu_sim-{os.getuid()}.sock")
+
+
+def _recv_exact(sock, n):
+    buffer = bytearray(n)
+    view = memoryview(buffer)
+    while view:
+        received = sock.recv_into(view)
+        if not received:
+            raise ConnectionError("the sbu_sim server closed the connection")
+        view = view[received:]
+    return buffer
+
+
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        source = self.server.source
+        while True:
+            try:
+                header = _recv_exact(self.request, _REQUEST.size)
+            except ConnectionError:
+                return
+            magic, version, op, count = _REQUEST.unpack(header)
+            if magic != MAGIC or version != VERSION:
+                self._reply(1, _JSON, 0, b"not an sbu_sim request")
+                return
+            points = np.frombuffer(
+                _recv_exact(self.request, count * 3 * 8), dtype="<f8"
+            ).reshape(count, 3)
+            try:
+                with trace.span("serve", "server"):
+                    if op == INFO:
+                        # the Q grid of the data the full interpolation uses
+                        core = source.full.get()
+                        dataset = source.dataset
+                        info = {
+                            "Q": np.asarray(core.dataset.Q).tolist(),
+                            "peak_locations": list(map(float, dataset.peak_locations)),
+                            "n_runs": len(dataset),
+                        }
+                        generation = core.generation
+                        dtype, payload = _JSON, json.dumps(info).encode()
+                    elif op in (FULL, ROIS):
+                        core = (source.full if op == FULL else source.rois).get()
+                        values = np.ascontiguousarray(core(points))
+                        generation = core.generation
+                        values = values.astype(
+                            values.dtype.newbyteorder("<"), copy=False
+                        )
+                        dtype, payload = values.dtype.str.encode(), values.data
+                    else:
+                        raise ValueError(f"unknown op {op}")
+            except Exception as err:
+                logger.exception("Failed to answer a request")
+                self._reply(1, _JSON, 0, repr(err).encode())
+                continue
+            self._reply(0, dtype, generation, payload)
+
+    def _reply(self, status, dtype, generation, payload):
+        payload = memoryview(payload).cast("B")
+        self.request.sendall(_RESPONSE.pack(status, dtype, generation, len(payload)))
+        self.request.sendall(payload)
+
+
+class SimServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """
+    Serve the interpolation of a `sbu_sim.ticu.SimSource` on a Unix socket.
+
+    Each connection is handled in its own thread, the interpolation cores
+    are safe to share between them.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, source, path=None):
+        """
+
+        Parameters
+        ----------
+        source : SimSource
+            The data to serve, both interpolations are built and used once
+            before the socket is opened.
+
+        path : str, optional
+            The socket to listen on, defaults to `default_socket_path`.
+            A stale socket file there is replaced.
+        """
+        self.source = source
+        # interpolate once so the lazily computed parts of the
+        # triangulation are ready before the first client asks
+        probe = np.asarray(source.dataset.coords[:1], dtype=float)
+        source.full(probe)
+        source.rois(probe)
+        path = os.fspath(path or default_socket_path())
+        if os.path.exists(path):
+            try:
+                with socket.socket(socket.AF_UNIX) as probe:
+                    probe.connect(path)
+            except OSError:
+                os.remove(path)
+            else:
+                raise RuntimeError(f"an sbu_sim server is already running on {path}")
+        super().__init__(path, _Handler)
+
+    def server_close(self):
+        super().server_close()
+        if os.path.exists(self.server_address):
+            os.remove(self.server_address)
+
+
+def serve(source, path=None, *, watch=None):
+    """
+    Load *source* and serve it until interrupted.
+
+    Parameters
+    ----------
+    source : str or Catalog or SimDataset
+        A packed dataset file (see `sbu_sim.packed`), the name of a
+        reduced TiCu catalog, a catalog or an already loaded dataset.
+
+    path : str, optional
+        The socket to listen on, defaults to `default_socket_path`.
+
+    watch : float, optional
+        If given, check the catalog for new runs every *watch* seconds,
+        see `sbu_sim.ticu.SimSource.watch`.
+    """
+    cat = None
+    if isinstance(source, ticu.SimDataset):
+        dataset = source
+    elif isinstance(source, (str, os.PathLike)) and os.path.exists(source):
+        dataset = packed.load(source)
+    else:
+        if isinstance(source, str):
+            import databroker
+
+            source = databroker.catalog[source]
+        cat = source
+        dataset = ticu.load_dataset(cat, ticu.DEFAULT_PEAK_LOCATIONS)
+    sim_source = ticu.SimSource(dataset, cat=cat)
+    if watch is not None and cat is not None:
+        sim_source.watch(watch)
+    with SimServer(sim_source, path) as server:
+        logger.info("Serving %d runs on %s", len(dataset), server.server_address)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+class RemoteCore:
+    """
+    One of the interpolations of a server, used like an `InterpolationCore`.
+
+    After each call *generation* is the one the server answered with, and
+    for the full interpolation *dataset* has the matching *Q*.
+    """
+
+    def __init__(self, client, op):
+        self._client = client
+        self._op = op
+        self.generation = None
+        self.dataset = None
+
+    def __call__(self, points):
+        while True:
+            values, generation = self._client._request(self._op, points)
+            self.generation = generation
+            if self._op != FULL or (
+                self.dataset is not None and self.dataset.generation == generation
+            ):
+                return values
+            # the data changed, get the Q grid it is on
+            info, info_generation = self._client._request(INFO)
+            if info_generation == generation:
+                self.dataset = types.SimpleNamespace(
+                    Q=np.asarray(info["Q"]), generation=generation
+                )
+                return values
+            # the data changed again between the two requests, ask again
+
+
+class SimClient:
+    """
+    A connection to a `SimServer`.
+
+    *full* and *rois* can be passed as the *core* of the ticu detectors,
+    and the client as the *dataset* of `sbu_sim.ticu.make_full_IofQ_detector`.
+    The connection is shared by all of the threads using it.
+    """
+
+    def __init__(self, path=None):
+        """
+
+        Parameters
+        ----------
+        path : str, optional
+            The socket of the server, defaults to `default_socket_path`.
+        """
+        self.path = os.fspath(path or default_socket_path())
+        self._sock = socket.socket(socket.AF_UNIX)
+        self._sock.connect(self.path)
+        self._lock = threading.Lock()
+        self.generation = None
+        self.full = RemoteCore(self, FULL)
+        self.rois = RemoteCore(self, ROIS)
+
+    def request(self, op, points=()):
+        """
+        Send one request and return the decoded response.
+
+        Parameters
+        ----------
+        op : {INFO, FULL, ROIS}
+            What to ask for
+
+        points : array[float]
+            (K, 3) array of positions, or a single (3,) position, to
+            interpolate at.
+
+        Returns
+        -------
+        dict or array[float]
+            The information for INFO, otherwise (K, M) interpolated values.
+        """
+        result, self.generation = self._request(op, points)
+        return result
+
+    def _request(self, op, points=()):
+        # returns the result with the generation of the server's answer
+        points = np.ascontiguousarray(points, dtype="<f8").reshape(-1, 3)
+        with self._lock, trace.span("request", "server"):
+            self._sock.sendall(_REQUEST.pack(MAGIC, VERSION, op, len(points)))
+            self._sock.sendall(points.data)
+            status, dtype, generation, length = _RESPONSE.unpack(
+                _recv_exact(self._sock, _RESPONSE.size)
+            )
+            payload = _recv_exact(self._sock, length)
+        if status:
+            raise RuntimeError(f"sbu_sim server error: {payload.decode()}")
+        if dtype == _JSON:
+            return json.loads(payload), generation
+        values = np.frombuffer(payload, dtype=dtype.decode())
+        return values.reshape(len(points), -1), generation
+
+    def info(self):
+        """The Q grid, peak locations and number of runs the server has now."""
+        return self.request(INFO)
+
+    @property
+    def Q(self):
+        """The Q values of the full I(Q) curves."""
+        return np.asarray(self.info()["Q"])
+
+    @property
+    def peak_locations(self):
+        """The peak locations the served ROIs were reduced with."""
+        return self.info()["peak_locations"]
+
+    def close(self):
+        self._sock.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
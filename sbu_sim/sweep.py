@@ -0,0 +1,164 @@
+"""Run many simulated adaptive campaigns in parallel across processes."""
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from bluesky import RunEngine
+
+from . import adaptive_integration as ai
+from . import packed
+from . import ticu
+from . import trace
+
+INDEPENDENT_KEYS = ["ctrl_Ti", "ctrl_anneal_time", "ctrl_temp"]
+
+# per-process state, set up once by `_init_worker`
+_dataset = None
+_sim = None
+
+
+def _init_worker(dataset):
+    global _dataset, _sim
+    if isinstance(dataset, (str, os.PathLike)):
+        dataset = packed.load(dataset)
+    _dataset = dataset
+    _sim = None
+
+
+def _get_sim():
+    """Build the devices and RunEngine for this process on first use."""
+    global _sim
+    if _sim is None:
+        _sim = (RunEngine({}), ticu.make_sim_devices(dataset=_dataset))
+    return _sim
+
+
+def _run_one(engine_factory, config, seed, first_point, plan, max_count):
+    RE, devices = _get_sim()
+    ctrl, rois = devices["ctrl"], devices["rois"]
+    dependent_keys = [k for k in rois.describe() if k.startswith("rois_I_")]
+    engine = engine_factory(config, seed)
+    if plan == "per_event":
+        factory, plan_function = (
+            ai.per_event_plan_gpcam_factory,
+            ai.per_event_adaptive_plan,
+        )
+    elif plan == "per_start":
+        factory, plan_function = (
+            ai.per_start_adaptive_factory,
+            ai.per_start_adaptive_plan,
+        )
+    else:
+        raise ValueError(f"plan must be 'per_event' or 'per_start', not {plan!r}")
+    callback, queue = factory(
+        engine, INDEPENDENT_KEYS, dependent_keys, max_count=max_count
+    )
+
+    rows = []
+    primary = set()
+
+    def collect(name, doc):
+        if name == "descriptor" and doc["name"] == "primary":
+            primary.add(doc["uid"])
+        elif name == "event" and doc["descriptor"] in primary:
+            rows.append(
+                {
+                    **config,
+                    "seed": seed,
+                    "step": len(rows),
+                    **{k: doc["data"][k] for k in INDEPENDENT_KEYS + dependent_keys},
+                }
+            )
+
+    RE(
+        plan_function(
+            [rois],
+            dict(zip([ctrl.Ti, ctrl.anneal_time, ctrl.temp], first_point)),
+            to_brains=callback,
+            from_brains=queue,
+        ),
+        collect,
+    )
+    # if tracing, each worker writes its own file after every campaign
+    trace.flush()
+    return rows
+
+
+def run_sweep(
+    dataset,
+    engine_factory,
+    configs,
+    seeds,
+    first_point,
+    *,
+    plan="per_event",
+    max_count=10,
+    max_workers=None,
+    share=True,
+):
+    """
+    Run a simulated adaptive campaign for each engine configuration and seed.
+
+    Each campaign runs the ticu simulated devices with a RunEngine in a
+    worker process.  By default the dataset and its triangulation are
+    published to shared memory once with `sbu_sim.packed.publish` and
+    every worker memory-maps them, so the workers neither copy the data
+    nor each triangulate it.
+
+    Parameters
+    ----------
+    dataset : SimDataset or str
+        The data to simulate from, it must include the ROIs.  A path to a
+        packed file is memory-mapped by each worker as it is.
+
+    engine_factory : Callable[[dict, int], ask / tell object]
+        Given a configuration and a seed return a fresh recommendation
+        engine.  It must be picklable, e.g. a module level function.
+
+    configs : List[dict]
+        The engine configurations to sweep over.
+
+    seeds : List[int]
+        The seeds to run for each configuration.
+
+    first_point : array[float]
+        The (Ti, anneal_time, temp) every campaign starts at.
+
+    plan : {'per_event', 'per_start'}, default 'per_event'
+        Whether to run `per_event_adaptive_plan` or `per_start_adaptive_plan`.
+
+    max_count : int, default 10
+        Passed through to the callback factory.
+
+    max_workers : int, optional
+        The number of processes to use, defaults to the number of CPUs.
+
+    share : bool, default True
+        If False send *dataset* to each worker when it starts instead,
+        each worker then builds its own interpolation.
+
+    Returns
+    -------
+    List[dict]
+        One row per measurement with the configuration, seed, step, and
+        the independent and dependent values.  Pass this to
+        `pandas.DataFrame` to get a data frame.
+    """
+    tasks = list(itertools.product(configs, seeds))
+    published = None
+    if share and isinstance(dataset, ticu.SimDataset):
+        dataset = published = packed.publish(dataset)
+    try:
+        with ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_init_worker, initargs=(dataset,)
+        ) as executor:
+            futures = [
+                executor.submit(
+                    _run_one, engine_factory, config, seed, first_point, plan, max_count
+                )
+                for config, seed in tasks
+            ]
+            return [row for future in futures for row in future.result()]
+    finally:
+        if published is not None:
+            os.remove(published)
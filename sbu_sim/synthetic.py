@@ -0,0 +1,220 @@
+"""
+Synthetic TiCu-like data for testing and benchmarking without the real catalog.
+
+The curves are a smooth background plus Gaussian peaks at the ticu
+default peak locations.  Each peak's height depends on the composition,
+grows with anneal time at a temperature dependent (Arrhenius) rate, and
+sharpens as it grows, so the data have the kind of structure the
+adaptive engines are meant to find.
+"""
+import uuid
+
+import numpy as np
+
+from . import ticu
+
+#: The default (low, high) range of each of (Ti, anneal_time, temp).
+DEFAULT_RANGES = ((0, 100), (0, 60), (300, 500))
+
+
+def _peak_parameters(coords, peak_locations, rng):
+    """The height and width of each peak for each run."""
+    Ti, anneal_time, temp = coords.T
+    n_peaks = len(peak_locations)
+    # each peak belongs to a phase that is stable above or below some
+    # composition
+    centers = rng.uniform(20, 80, n_peaks)
+    sign = np.where(np.arange(n_peaks) % 2, 1, -1)
+    phase = 1 / (1 + np.exp(sign * (Ti[:, None] - centers) / 8))
+    # the phase grows in with an Arrhenius rate
+    activation = rng.uniform(2000, 4000, n_peaks)
+    rate = 0.05 * np.exp(-activation * (1 / (temp[:, None] + 273) - 1 / 673))
+    growth = 1 - np.exp(-rate * anneal_time[:, None])
+    height = rng.uniform(50, 200, n_peaks) * phase * growth
+    width = 0.01 + 0.03 * (1 - growth)
+    return height, width
+
+
+def make_dataset(
+    n_runs,
+    n_q=3000,
+    *,
+    peak_locations=None,
+    coords=None,
+    ranges=DEFAULT_RANGES,
+    noise=1.0,
+    seed=None,
+    dtype=float,
+    out=None,
+    chunk_size=None,
+):
+    """
+    Generate a TiCu-like `SimDataset`.
+
+    The curves are generated in chunks of runs so the peak memory, beyond
+    the output itself, does not depend on *n_runs*.
+
+    Parameters
+    ----------
+    n_runs : int
+        The number of runs to generate
+
+    n_q : int, default 3000
+        The number of Q bins
+
+    peak_locations : array[float], optional
+        Where to put the peaks, and the ROIs to reduce.  Defaults to
+        `sbu_sim.ticu.DEFAULT_PEAK_LOCATIONS`
+
+    coords : array[float], optional
+        (n_runs, 3) array of the (Ti, anneal_time, temp) to use, by
+        default these are drawn uniformly from *ranges*
+
+    ranges : Tuple[Tuple[float, float], ...], optional
+        The (low, high) range of each coordinate
+
+    noise : float, default 1.0
+        The standard deviation of the noise added to the curves
+
+    seed : int, optional
+        Seed for the random number generator
+
+    dtype : dtype, default float
+        The dtype of the generated curves
+
+    out : array, optional
+        A (n_runs, n_q) array, for example a `numpy.memmap`, to write the
+        curves into.
+
+    chunk_size : int, optional
+        The number of runs to generate at once.
+
+    Returns
+    -------
+    SimDataset
+    """
+    rng = np.random.default_rng(seed)
+    if peak_locations is None:
+        peak_locations = ticu.DEFAULT_PEAK_LOCATIONS
+    peak_locations = np.asarray(peak_locations, dtype=float)
+    if coords is None:
+        low, high = np.asarray(ranges, dtype=float).T
+        coords = rng.uniform(low, high, size=(n_runs, 3))
+    coords = np.asarray(coords, dtype=float)
+    Q = np.linspace(0.5, 8, n_q)
+    if out is None:
+        out = np.empty((n_runs, n_q), dtype=dtype)
+    if chunk_size is None:
+        # keep each temporary to ~8MB
+        chunk_size = max(1, 2 ** 20 // n_q)
+
+    height, width = _peak_parameters(coords, peak_locations, rng)
+    background = 10 * np.exp(-Q / 2)
+    # the peaks are narrow, only evaluate them within 6 sigma of the center
+    windows = [
+        slice(*np.searchsorted(Q, [q - 6 * width.max(), q + 6 * width.max()]))
+        for q in peak_locations
+    ]
+    for start in range(0, n_runs, chunk_size):
+        stop = min(start + chunk_size, n_runs)
+        chunk = np.broadcast_to(background, (stop - start, n_q)).copy()
+        for k, (q, window) in enumerate(zip(peak_locations, windows)):
+            w = width[start:stop, k : k + 1]
+            chunk[:, window] += height[start:stop, k : k + 1] * np.exp(
+                -((Q[window] - q) ** 2) / (2 * w ** 2)
+            )
+        if noise:
+            chunk += rng.normal(0, noise, size=chunk.shape)
+        out[start:stop] = chunk
+
+    return ticu.SimDataset(
+        coords,
+        out,
+        Q,
+        rois=ticu.reduce_array(out, Q, peak_locations),
+        peak_locations=list(peak_locations),
+        uids=[str(uuid.UUID(bytes=rng.bytes(16))) for _ in range(n_runs)],
+    )
+
+
+class _Stream:
+    def __init__(self, data):
+        self._data = data
+
+    def read(self):
+        return self._data
+
+
+class SyntheticRun:
+    """The parts of the BlueskyRun interface that `sbu_sim.ticu` uses."""
+
+    def __init__(self, start, I, Q):
+        self.metadata = {"start": start}
+        self.primary = _Stream({"I": I, "Q": Q})
+
+
+def make_catalog(n_runs, n_q=3000, **kwargs):
+    """
+    Generate an in-memory catalog of TiCu-like runs.
+
+    The result can be passed anywhere `sbu_sim.ticu` expects the reduced
+    catalog.  Takes the same arguments as `make_dataset`.
+
+    Returns
+    -------
+    Dict[str, SyntheticRun]
+        The runs keyed on uid.
+    """
+    dataset = make_dataset(n_runs, n_q, **kwargs)
+    return {
+        uid: SyntheticRun(
+            {"uid": uid, "Ti": Ti, "anneal_time": anneal_time, "temp": temp},
+            I,
+            dataset.Q,
+        )
+        for uid, (Ti, anneal_time, temp), I in zip(
+            dataset.uids, dataset.coords.tolist(), dataset.I
+        )
+    }
+
+
+def documents(dataset):
+    """
+    Generate event-model documents for each run in *dataset*.
+
+    These can be inserted into a real databroker or serialized with
+    suitcase, one run per Start document.  Like the reduced TiCu catalog
+    (and `make_catalog`) the primary stream has one Event per Q bin with
+    scalar *I* and *Q*, so reading it back gives (n_q,) arrays.  The
+    Events of each run are in a single EventPage.
+
+    Yields
+    ------
+    name : str
+    doc : dict
+    """
+    from event_model import compose_run
+
+    n_q = len(dataset.Q)
+    data_keys = {
+        "I": {"dtype": "number", "shape": [], "source": "synthetic"},
+        "Q": {"dtype": "number", "shape": [], "source": "synthetic"},
+    }
+    Q = np.asarray(dataset.Q).tolist()
+    zeros = [0] * n_q
+    for uid, (Ti, anneal_time, temp), I in zip(
+        dataset.uids, dataset.coords.tolist(), dataset.I
+    ):
+        bundle = compose_run(
+            uid=uid, metadata={"Ti": Ti, "anneal_time": anneal_time, "temp": temp}
+        )
+        yield "start", bundle.start_doc
+        desc = bundle.compose_descriptor(name="primary", data_keys=data_keys)
+        yield "descriptor", desc.descriptor_doc
+        yield "event_page", desc.compose_event_page(
+            data={"I": np.asarray(I).tolist(), "Q": Q},
+            timestamps={"I": zeros, "Q": zeros},
+            seq_num=list(range(1, n_q + 1)),
+            time=zeros,
+        )
+        yield "stop", bundle.compose_stop()
@@ -0,0 +1,17 @@
+import itertools
+
+import numpy as np
+import pytest
+
+from sbu_sim import synthetic
+
+
+@pytest.fixture
+def ticu_cat():
+    """A small catalog of synthetic runs on a regular grid."""
+    coords = list(
+        itertools.product(
+            np.linspace(0, 100, 5), np.linspace(0, 60, 4), np.linspace(300, 500, 3)
+        )
+    )
+    return synthetic.make_catalog(len(coords), 500, coords=coords, seed=0)
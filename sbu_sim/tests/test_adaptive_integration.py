@@ -0,0 +1,350 @@
+from queue import Queue, Empty
+
+import numpy as np
+import pytest
+from bluesky import RunEngine
+from ophyd.sim import det, motor, motor1, motor2
+
+from sbu_sim import ticu
+from sbu_sim.adaptive_integration import (
+    HEARTBEAT,
+    Deadline,
+    Fallback,
+    Heartbeat,
+    LatencyLog,
+    MeasurementCache,
+    MinStep,
+    StepAdaptive,
+    UncertaintyPlateau,
+    per_event_adaptive_plan,
+    per_event_plan_gpcam_factory,
+    per_event_plan_sequence_factory,
+    per_event_plan_step_factory,
+    per_start_adaptive_factory,
+    per_start_adaptive_factory_factory,
+    per_start_adaptive_plan,
+    summarize_latency,
+    warm_start,
+)
+
+
+@pytest.fixture
+def RE():
+    return RunEngine({})
+
+
+def test_wait_policies():
+    q = Queue()
+    with pytest.raises(Empty):
+        Deadline(0.01).get(q, {})
+    # heartbeats are skipped, but do not extend the deadline
+    q.put(HEARTBEAT)
+    q.put({"motor": 0})
+    assert Deadline(0.01).get(q, {}) == {"motor": 0}
+    q.put(HEARTBEAT)
+    with pytest.raises(Empty):
+        Deadline(0.01).get(q, {})
+
+    q.put(HEARTBEAT)
+    q.put({"motor": 1})
+    assert Heartbeat(0.01).get(q, {}) == {"motor": 1}
+
+    policy = Fallback(0.01, lambda last: {"motor": last["motor"] + 5})
+    assert policy.get(q, {"motor": 1}) == {"motor": 6}
+    # the late recommendation is dropped, the next one is used
+    q.put({"motor": 2})
+    q.put({"motor": 3})
+    assert policy.get(q, {"motor": 6}) == {"motor": 3}
+
+
+def test_per_event_wait_time_recorded(RE):
+    cb, queue = per_event_plan_step_factory(
+        np.array([1.0]), ["motor"], ["det"], max_count=3
+    )
+    docs = []
+    RE(
+        per_event_adaptive_plan(
+            [det], {motor: 0}, to_brains=cb, from_brains=queue
+        ),
+        lambda name, doc: docs.append((name, doc)),
+    )
+    descriptors = {
+        doc["uid"]: doc["name"] for name, doc in docs if name == "descriptor"
+    }
+    events = [doc for name, doc in docs if name == "event"]
+    primary = [ev for ev in events if descriptors[ev["descriptor"]] == "primary"]
+    waits = [ev for ev in events if descriptors[ev["descriptor"]] == "adaptive"]
+    assert [ev["data"]["motor"] for ev in primary] == [0, 1, 2, 3]
+    assert len(waits) == len(primary)
+    assert all(ev["data"]["adaptive_wait_time"] >= 0 for ev in waits)
+
+
+def test_stop_criteria(RE):
+    plateau = UncertaintyPlateau(lambda engine: engine, patience=2)
+    assert [plateau.should_stop(engine=u) for u in [10, 5, 4.99, 4.99]] == [
+        False,
+        False,
+        False,
+        True,
+    ]
+
+    cb, queue = per_event_plan_step_factory(
+        np.array([1.0]),
+        ["motor"],
+        ["det"],
+        max_count=10,
+        stop_criteria=[MinStep(2)],
+    )
+    docs = []
+    RE(
+        per_event_adaptive_plan(
+            [det], {motor: 0}, to_brains=cb, from_brains=queue
+        ),
+        lambda name, doc: docs.append((name, doc)),
+    )
+    stop, = [doc for name, doc in docs if name == "stop"]
+    assert stop["num_events"]["primary"] == 2
+
+
+def test_warm_start(ticu_cat):
+    class Recorder:
+        def __init__(self):
+            self.told = []
+
+        def tell_many(self, xs, ys):
+            self.told.append((xs, ys))
+
+    X, Y = ticu.reduce_catalog(ticu_cat, ticu.DEFAULT_PEAK_LOCATIONS)
+    assert X.shape == (len(ticu_cat), 3)
+    assert Y.shape == (len(ticu_cat), len(ticu.DEFAULT_PEAK_LOCATIONS))
+
+    engine = warm_start(Recorder(), X, Y)
+    assert len(engine.told) == 1
+
+    # engines without tell_many are told one point at a time
+    step = warm_start(StepAdaptive(np.ones(3)), X, Y)
+    np.testing.assert_array_equal(step.ask(1), X[-1] + 1)
+
+
+def test_measurement_cache(RE):
+    class Sequence:
+        def __init__(self, points):
+            self.points = iter(points)
+            self.told = []
+
+        def tell(self, x, y):
+            self.told.append(x)
+
+        def ask(self, n):
+            return np.array([next(self.points)])
+
+    cache = MeasurementCache(0.01)
+    engine = Sequence([1, 1.005, 2, 0.001, 3])
+    cb, queue = per_event_plan_gpcam_factory(
+        engine, ["motor"], ["det"], max_count=3, cache=cache
+    )
+    docs = []
+    RE(
+        per_event_adaptive_plan([det], {motor: 0}, to_brains=cb, from_brains=queue),
+        lambda name, doc: docs.append((name, doc)),
+    )
+    (stop,) = [doc for name, doc in docs if name == "stop"]
+    assert stop["num_events"]["primary"] == 4
+    assert cache.hits == 2
+    assert len(cache) == 3
+    assert len(engine.told) == 5
+
+    # 0 tolerance on an axis means it must match exactly, both for the
+    # brute force tail and the indexed points
+    cache = MeasurementCache([0.1, 0])
+    for j in range(40):
+        cache.add([j, j % 3], j)
+        assert cache.lookup([j + 0.05, j % 3]) == j
+        assert cache.lookup([j + 0.05, j % 3 + 1e-9]) is None
+        assert cache.lookup([j, 7]) is None
+
+
+def test_skip_noop_moves(RE):
+    motor1.set(0)
+    motor2.set(5)
+    cb, queue = per_event_plan_step_factory(
+        np.array([1.0, 0.0]), ["motor1", "motor2"], ["det"], max_count=3
+    )
+    docs = []
+    RE(
+        per_event_adaptive_plan(
+            [det], {motor1: 0, motor2: 5}, to_brains=cb, from_brains=queue
+        ),
+        lambda name, doc: docs.append((name, doc)),
+    )
+    descriptors = {
+        doc["uid"]: doc["name"] for name, doc in docs if name == "descriptor"
+    }
+    skipped = [
+        doc["data"]["adaptive_moves_skipped"]
+        for name, doc in docs
+        if name == "event" and descriptors[doc["descriptor"]] == "adaptive"
+    ]
+    assert skipped == [2, 1, 1, 1]
+
+
+def test_latency(RE):
+    latency = LatencyLog()
+    cb, queue = per_event_plan_gpcam_factory(
+        StepAdaptive(np.array([1.0])), ["motor"], ["det"], max_count=3, latency=latency
+    )
+    docs = []
+    RE(
+        per_event_adaptive_plan(
+            [det], {motor: 0}, to_brains=cb, from_brains=queue, latency=latency
+        ),
+        lambda name, doc: docs.append((name, doc)),
+    )
+    assert len(latency.records) == 4
+    # the last point is not told to the engine
+    assert np.isnan(latency.records[-1]["tell_time"])
+    assert all(r["dispatch_time"] >= 0 for r in latency.records)
+
+    summary = summarize_latency(latency, percentiles=(50, 100))
+    assert set(summary) == {
+        "move_time",
+        "read_time",
+        "dispatch_time",
+        "tell_time",
+        "ask_time",
+        "wait_time",
+    }
+    assert summary["read_time"][50] <= summary["read_time"][100]
+
+    descriptors = {
+        doc["uid"]: doc["name"] for name, doc in docs if name == "descriptor"
+    }
+    adaptive = [
+        doc["data"]
+        for name, doc in docs
+        if name == "event" and descriptors[doc["descriptor"]] == "adaptive"
+    ]
+    streamed = summarize_latency(
+        {k: [d[k] for d in adaptive] for k in adaptive[0]}, percentiles=(50, 100)
+    )
+    assert streamed["tell_time"] == summary["tell_time"]
+
+
+def test_custom_callback_sees_primary_only(RE):
+    queue = Queue()
+    targets = iter([1, 2, 3, None])
+    seen = []
+
+    def callback(name, doc):
+        # a recommendation for every Event, as the plan documents
+        if name == "event":
+            seen.append(doc["data"]["motor"])
+            target = next(targets)
+            queue.put(None if target is None else {"motor": target})
+
+    docs = []
+    RE(
+        per_event_adaptive_plan([det], {motor: 0}, to_brains=callback, from_brains=queue),
+        lambda name, doc: docs.append((name, doc)),
+    )
+    assert seen == [0, 1, 2, 3]
+    (stop,) = [doc for name, doc in docs if name == "stop"]
+    assert stop["num_events"] == {"primary": 4, "adaptive": 4}
+
+
+def test_stop_criteria_reset_per_batch(RE):
+    # the uncertainty never improves, so each batch stops after 3 Runs
+    plateau = UncertaintyPlateau(lambda engine: 1.0, patience=2)
+    cb, queue = per_start_adaptive_factory_factory(
+        lambda start: StepAdaptive(np.array([1.0])),
+        ["motor"],
+        ["det"],
+        stop_criteria=[plateau],
+    )
+    for _ in range(2):
+        starts = []
+        RE(
+            per_start_adaptive_plan(
+                [det], {motor: 0}, to_brains=cb, from_brains=queue
+            ),
+            lambda name, doc: starts.append(doc) if name == "start" else None,
+        )
+        assert len(starts) == 3
+
+
+def test_cache_reset_per_batch(RE):
+    # every batch visits the same points with a fresh engine
+    cache = MeasurementCache(0.01)
+    cb, queue = per_start_adaptive_factory_factory(
+        lambda start: StepAdaptive(np.array([1.0])),
+        ["motor"],
+        ["det"],
+        max_count=3,
+        cache=cache,
+    )
+    for _ in range(2):
+        RE(per_start_adaptive_plan([det], {motor: 0}, to_brains=cb, from_brains=queue))
+        assert len(cache) > 1
+        assert cache.hits == 0
+
+
+def test_skipped_moves_do_not_drift(RE):
+    motor.set(0)
+    cb, queue = per_event_plan_sequence_factory(
+        [[0.4], [0.8], [1.2], [1.6]], ["motor"], ["det"], max_count=5
+    )
+    docs = []
+    RE(
+        per_event_adaptive_plan(
+            [det],
+            {motor: 0},
+            to_brains=cb,
+            from_brains=queue,
+            move_tolerance=0.5,
+        ),
+        lambda name, doc: docs.append((name, doc)),
+    )
+    descriptors = {
+        doc["uid"]: doc["name"] for name, doc in docs if name == "descriptor"
+    }
+    read = [
+        doc["data"]["motor"]
+        for name, doc in docs
+        if name == "event" and descriptors[doc["descriptor"]] == "primary"
+    ]
+    # each target is compared with where the motor is, not the last target
+    assert read == [0, 0, 0.8, 0.8, 1.6]
+
+
+def test_per_start_latency_in_start(RE):
+    latency = LatencyLog()
+    cb, queue = per_start_adaptive_factory(
+        StepAdaptive(np.array([1.0])), ["motor"], ["det"], max_count=2, latency=latency
+    )
+    docs = []
+    RE(
+        per_start_adaptive_plan(
+            [det], {motor: 0}, to_brains=cb, from_brains=queue, latency=latency
+        ),
+        lambda name, doc: docs.append((name, doc)),
+    )
+    starts = [doc for name, doc in docs if name == "start"]
+    assert len(starts) == len(latency.records) == 4
+    assert starts[0]["latency"] == {}
+    for start, record in zip(starts[1:], latency.records):
+        assert start["latency"] == pytest.approx(record)
+        assert start["latency"]["wait_time"] == start["wait_time"]
+
+    # every Run, including the last, has its own timings
+    descriptors = {
+        doc["uid"]: doc["name"] for name, doc in docs if name == "descriptor"
+    }
+    adaptive = [
+        doc["data"]
+        for name, doc in docs
+        if name == "event" and descriptors[doc["descriptor"]] == "adaptive"
+    ]
+    assert len(adaptive) == 4
+    for data, record in zip(adaptive, latency.records):
+        assert data["adaptive_wait_time"] == pytest.approx(record["wait_time"])
+        assert data["adaptive_read_time"] == pytest.approx(record["read_time"])
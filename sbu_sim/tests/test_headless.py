@@ -0,0 +1,54 @@
+import numpy as np
+from bluesky import RunEngine
+
+from sbu_sim import ticu
+from sbu_sim.adaptive_integration import (
+    StepAdaptive,
+    per_event_adaptive_plan,
+    per_event_plan_gpcam_factory,
+)
+from sbu_sim.headless import run_campaign, run_campaigns
+
+
+def test_headless_matches_run_engine(ticu_cat):
+    dataset = ticu.load_dataset(ticu_cat, ticu.DEFAULT_PEAK_LOCATIONS)
+    devices = ticu.make_sim_devices(ticu_cat)
+    ctrl, rois = devices["ctrl"], devices["rois"]
+    step = np.array([5.0, 2.0, 10.0])
+    first_point = [10.0, 5.0, 320.0]
+
+    independent_keys = ["ctrl_Ti", "ctrl_anneal_time", "ctrl_temp"]
+    dependent_keys = [k for k in rois.describe() if k.startswith("rois_I_")]
+    cb, queue = per_event_plan_gpcam_factory(
+        StepAdaptive(step), independent_keys, dependent_keys, max_count=5
+    )
+    docs = []
+    RunEngine({})(
+        per_event_adaptive_plan(
+            [rois],
+            dict(zip([ctrl.Ti, ctrl.anneal_time, ctrl.temp], first_point)),
+            to_brains=cb,
+            from_brains=queue,
+        ),
+        lambda name, doc: docs.append((name, doc)),
+    )
+    (primary,) = [
+        doc["uid"] for name, doc in docs if name == "descriptor" and doc["name"] == "primary"
+    ]
+    events = [doc for name, doc in docs if name == "event" and doc["descriptor"] == primary]
+    x_re = np.array([[ev["data"][k] for k in independent_keys] for ev in events])
+    y_re = np.array([[ev["data"][k] for k in dependent_keys] for ev in events])
+
+    core = ticu.InterpolationCore(dataset.coords, dataset.rois)
+    x, y = run_campaign(StepAdaptive(step), core, first_point, max_count=5)
+    np.testing.assert_allclose(x, x_re)
+    np.testing.assert_allclose(y, y_re)
+
+    (x_many, y_many), _ = run_campaigns(
+        [StepAdaptive(step), StepAdaptive(-step)],
+        core,
+        [first_point, [90.0, 50.0, 480.0]],
+        max_count=5,
+    )
+    np.testing.assert_allclose(x_many, x)
+    np.testing.assert_allclose(y_many, y)
@@ -0,0 +1,70 @@
+import os
+
+import numpy as np
+import pytest
+
+from sbu_sim import packed, synthetic, ticu
+
+
+@pytest.mark.parametrize("mmap", [True, False])
+def test_packed_round_trip(tmp_path, mmap):
+    dataset = synthetic.make_dataset(30, 200, seed=0)
+    path = packed.save(dataset, tmp_path / "ticu.sbusim", provenance={"catalog": "test"})
+
+    loaded = packed.load(path, mmap=mmap)
+    assert isinstance(loaded.I, np.memmap) == mmap
+    for name in ["coords", "I", "Q", "rois"]:
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(dataset, name))
+    assert loaded.uids == dataset.uids
+    assert loaded.peak_locations == ticu.DEFAULT_PEAK_LOCATIONS
+    assert loaded.provenance["catalog"] == "test"
+
+    devices = ticu.make_sim_devices(str(path))
+    assert set(devices) == {"ctrl", "full", "rois"}
+
+
+def test_not_packed(tmp_path):
+    path = tmp_path / "junk"
+    path.write_bytes(b"\0" * 64)
+    with pytest.raises(ValueError):
+        packed.load(path)
+
+
+def test_pack_catalog_streams(tmp_path):
+    cat = synthetic.make_catalog(50, 200, seed=1)
+    path = packed.pack_catalog(cat, tmp_path / "cat.sbusim", chunk_size=7)
+    loaded = packed.load(path)
+    expected = ticu.load_dataset(cat, ticu.DEFAULT_PEAK_LOCATIONS)
+    for name in ["coords", "I", "Q", "rois"]:
+        np.testing.assert_array_equal(getattr(loaded, name), getattr(expected, name))
+    assert loaded.uids == expected.uids
+
+    # interpolating the memory map only reads the rows it needs
+    out_of_core = ticu.OutOfCoreInterpolationCore(loaded.coords, loaded.I)
+    in_memory = ticu.InterpolationCore(expected.coords, expected.I)
+    points = np.random.default_rng(0).uniform([0, 0, 300], [100, 60, 500], (20, 3))
+    np.testing.assert_allclose(out_of_core(points), in_memory(points))
+
+
+def test_publish_shares_triangulation(tmp_path):
+    dataset = synthetic.make_dataset(60, 100, seed=2)
+    path = packed.publish(dataset, tmp_path / "shared.sbusim")
+    assert os.listdir(tmp_path) == ["shared.sbusim"]
+
+    loaded = packed.load(path)
+    tri = loaded.triangulation
+    assert isinstance(tri.simplices, np.memmap)
+    assert isinstance(tri.transform, np.memmap)
+    assert tri.points is loaded.coords
+
+    points = np.random.default_rng(0).uniform([0, 0, 300], [100, 60, 500], (20, 3))
+    shared = ticu.OutOfCoreInterpolationCore(loaded.coords, loaded.rois, tri=tri)
+    fresh = ticu.InterpolationCore(dataset.coords, dataset.rois)
+    np.testing.assert_allclose(shared(points), fresh(points))
+
+    devices = ticu.make_sim_devices(path)
+    devices["ctrl"].Ti.set(40)
+    devices["rois"].trigger()
+    # the detectors use the stored triangulation rather than making one
+    used = devices["rois"].source.rois.get()._interpolator.args[0]
+    assert os.path.samefile(used.simplices.filename, path)
@@ -0,0 +1,98 @@
+import threading
+
+import numpy as np
+import pytest
+from bluesky import RunEngine
+import bluesky.plans as bp
+
+from sbu_sim import server, synthetic, ticu
+
+
+@pytest.fixture
+def sim_server(tmp_path):
+    cat = synthetic.make_catalog(50, 200, seed=1)
+    source = ticu.SimSource(ticu.load_dataset(cat, ticu.DEFAULT_PEAK_LOCATIONS))
+    srv = server.SimServer(source, tmp_path / "sim.sock")
+    thread = threading.Thread(target=srv.serve_forever, daemon=True)
+    thread.start()
+    yield cat, source, srv.server_address
+    srv.shutdown()
+    srv.server_close()
+    thread.join()
+
+
+def _read(devices):
+    RE = RunEngine({})
+    data = []
+    RE.subscribe(lambda name, doc: data.append(doc) if name == "event" else None)
+    for Ti in [30, 42]:
+        devices["ctrl"].Ti.set(Ti)
+        RE(bp.count([devices["full"], devices["rois"]]))
+    return [d["data"] for d in data]
+
+
+def test_served_devices_match_local(sim_server):
+    cat, _, path = sim_server
+    remote = ticu.make_sim_devices(server=path)
+    expected = _read(ticu.make_sim_devices(cat))
+    actual = _read(remote)
+    for a, e in zip(actual, expected):
+        assert a.keys() == e.keys()
+        for k in e:
+            np.testing.assert_allclose(a[k], e[k])
+
+    client = remote["rois"].client
+    assert client.info()["n_runs"] == 50
+    points = np.random.default_rng(0).uniform([0, 0, 300], [100, 60, 500], (7, 3))
+    with server.SimClient(path) as other:
+        np.testing.assert_allclose(
+            other.full(points), ticu.make_sim_devices(cat)["full"].source.full(points)
+        )
+    with pytest.raises(RuntimeError):
+        client.request(7)
+    # the connection is still usable after an error
+    assert client.rois(points).shape == (7, len(ticu.DEFAULT_PEAK_LOCATIONS))
+
+    with pytest.raises(ValueError):
+        ticu.make_sim_devices(server=path, peak_locations=[1.0])
+    with pytest.raises(RuntimeError):
+        server.SimServer(ticu.SimSource(synthetic.make_dataset(10, 20)), path)
+
+
+def test_served_data_changes(sim_server):
+    cat, source, path = sim_server
+    devices = ticu.make_sim_devices(server=path)
+    ctrl, full, rois = devices["ctrl"], devices["full"], devices["rois"]
+    ctrl.Ti.set(42)
+    full.trigger()
+    rois.trigger()
+    assert full.I.get().shape == full.Q.get().shape == (200,)
+
+    # a new Q grid is picked up with the curves on it
+    source.reload(synthetic.make_catalog(60, 300, seed=2), background=False)
+    full.trigger()
+    rois.trigger()
+    I, Q = full.I.get(), full.Q.get()
+    assert I.shape == Q.shape == (300,)
+    np.testing.assert_allclose(Q, source.dataset.Q)
+    peaks = [rois.I_00.get(), rois.I_01.get()]
+
+    # the same position, but not the same answer
+    new = source.dataset
+    source.reload(
+        ticu.SimDataset(
+            new.coords,
+            10 * new.I,
+            new.Q,
+            peak_locations=new.peak_locations,
+            uids=new.uids,
+        ),
+        background=False,
+    )
+    full.trigger()
+    rois.trigger()
+    np.testing.assert_allclose(full.I.get(), 10 * I)
+    np.testing.assert_allclose(full.Q.get(), Q)
+    np.testing.assert_allclose(
+        [rois.I_00.get(), rois.I_01.get()], np.multiply(peaks, 10)
+    )
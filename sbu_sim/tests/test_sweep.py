@@ -0,0 +1,25 @@
+import numpy as np
+
+from sbu_sim import ticu
+from sbu_sim.adaptive_integration import StepAdaptive
+from sbu_sim.sweep import run_sweep
+
+
+def _step_engine(config, seed):
+    return StepAdaptive(np.array(config["step"]) * (1 + seed))
+
+
+def test_run_sweep(ticu_cat):
+    dataset = ticu.load_dataset(ticu_cat, ticu.DEFAULT_PEAK_LOCATIONS)
+    rows = run_sweep(
+        dataset,
+        _step_engine,
+        [{"step": [1.0, 1.0, 1.0]}, {"step": [2.0, 0.0, 0.0]}],
+        [0, 1],
+        [10.0, 5.0, 320.0],
+        max_count=3,
+        max_workers=2,
+    )
+    assert len(rows) == 2 * 2 * 4
+    last = [r for r in rows if r["step"] == 3 and r["seed"] == 1]
+    assert sorted(r["ctrl_Ti"] for r in last) == [16.0, 22.0]
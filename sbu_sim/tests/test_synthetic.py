@@ -0,0 +1,40 @@
+import numpy as np
+
+from sbu_sim import synthetic, ticu
+
+
+def test_synthetic_dataset_matches_catalog():
+    dataset = synthetic.make_dataset(25, 400, seed=3, chunk_size=7)
+    assert dataset.I.shape == (25, 400)
+    assert dataset.rois.shape == (25, len(ticu.DEFAULT_PEAK_LOCATIONS))
+
+    cat = synthetic.make_catalog(25, 400, seed=3)
+    loaded = ticu.load_dataset(cat, ticu.DEFAULT_PEAK_LOCATIONS)
+    assert loaded.uids == dataset.uids
+    np.testing.assert_allclose(loaded.coords, dataset.coords)
+    np.testing.assert_allclose(loaded.I, dataset.I)
+    np.testing.assert_allclose(loaded.rois, dataset.rois)
+
+
+def test_synthetic_documents():
+    dataset = synthetic.make_dataset(3, 100, seed=0)
+    docs = list(synthetic.documents(dataset))
+    assert [name for name, doc in docs] == [
+        "start",
+        "descriptor",
+        "event_page",
+        "stop",
+    ] * 3
+
+    # read the runs back the way databroker does, each field stacked
+    # over the Events of the stream
+    cat = {}
+    for (_, start), _, (_, page), _ in zip(*[iter(docs)] * 4):
+        data = {k: np.asarray(v) for k, v in page["data"].items()}
+        cat[start["uid"]] = synthetic.SyntheticRun(start, data["I"], data["Q"])
+    loaded = ticu.load_dataset(cat, ticu.DEFAULT_PEAK_LOCATIONS)
+    assert loaded.uids == dataset.uids
+    np.testing.assert_allclose(loaded.coords, dataset.coords)
+    np.testing.assert_allclose(loaded.Q, dataset.Q)
+    np.testing.assert_allclose(loaded.I, dataset.I)
+    np.testing.assert_allclose(loaded.rois, dataset.rois)
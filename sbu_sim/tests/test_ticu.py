@@ -0,0 +1,460 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+from bluesky import RunEngine
+import bluesky.plans as bp
+from ophyd.utils import ReadOnlyError
+
+from sbu_sim import packed, synthetic, ticu
+
+
+class GatedCatalog(dict):
+    """A catalog that blocks listing its runs until *gate* is set."""
+
+    def __init__(self, cat):
+        super().__init__(cat)
+        self.gate = threading.Event()
+
+    def __iter__(self):
+        assert self.gate.wait(10)
+        return super().__iter__()
+
+
+def _read_all(devices):
+    RE = RunEngine({})
+    data = []
+    RE.subscribe(lambda name, doc: data.append(doc) if name == "event" else None)
+    devices["ctrl"].Ti.set(42)
+    RE(bp.count([devices["full"], devices["rois"]]))
+    return data[0]["data"]
+
+
+def test_background(ticu_cat):
+    gated = GatedCatalog(ticu_cat)
+    devices = ticu.make_sim_devices(gated, background=True)
+    assert set(devices) == {"ctrl", "full", "rois"}
+    gated.gate.set()
+
+    expected = _read_all(ticu.make_sim_devices(ticu_cat))
+    actual = _read_all(devices)
+    assert actual.keys() == expected.keys()
+    for k in expected:
+        np.testing.assert_array_equal(actual[k], expected[k])
+
+
+def test_lazy_core_builds_once():
+    calls = []
+    started = threading.Event()
+
+    def build():
+        calls.append(1)
+        started.set()
+        return lambda points: np.asarray(points) * 2
+
+    core = ticu.LazyInterpolationCore(build)
+    assert not core.built
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(core([1.0, 2.0, 3.0])))
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert core.built
+    assert len(calls) == 1
+    for r in results:
+        np.testing.assert_array_equal(r, [2, 4, 6])
+
+
+def test_unused_detector_not_built(ticu_cat, monkeypatch):
+    built = []
+    original = ticu.InterpolationCore
+
+    def counting(coords, values, **kwargs):
+        built.append(values.shape)
+        return original(coords, values, **kwargs)
+
+    monkeypatch.setattr(ticu, "InterpolationCore", counting)
+    devices = ticu.make_sim_devices(ticu_cat)
+    assert built == []
+    devices["rois"].trigger()
+    devices["rois"].trigger()
+    assert built == [(60, len(ticu.DEFAULT_PEAK_LOCATIONS))]
+
+
+def test_update():
+    cat = synthetic.make_catalog(80, 200, seed=1)
+    uids = list(cat)
+    partial = {uid: cat[uid] for uid in uids[:50]}
+    devices = ticu.make_sim_devices(partial)
+    source = devices["rois"].source
+    # build the ROI interpolation before the update, leave full for after
+    devices["ctrl"].Ti.set(42)
+    devices["rois"].trigger()
+
+    partial.update({uid: cat[uid] for uid in uids[50:70]})
+    assert source.update() == 20
+    assert source.update() == 0
+    partial.update({uid: cat[uid] for uid in uids[70:]})
+    assert source.update() == 10
+    assert len(source.dataset) == 80
+    assert source.dataset.uids == uids
+
+    expected = _read_all(ticu.make_sim_devices(cat))
+    actual = _read_all(devices)
+    for k in expected:
+        np.testing.assert_allclose(actual[k], expected[k])
+
+
+def test_reload(tmp_path):
+    devices = ticu.make_sim_devices(synthetic.make_catalog(50, 200, seed=1))
+    source = devices["full"].source
+    _read_all(devices)
+
+    new_cat = synthetic.make_catalog(60, 300, seed=2)
+    source.reload(new_cat).result()
+    expected = _read_all(ticu.make_sim_devices(new_cat))
+    actual = _read_all(devices)
+    assert actual["full_I"].shape == (300,)
+    for k in expected:
+        np.testing.assert_allclose(actual[k], expected[k])
+
+    # a packed file is reduced with the peaks the devices were made with
+    dataset = synthetic.make_dataset(40, 200, peak_locations=[1.5, 2.5], seed=3)
+    path = packed.save(dataset, tmp_path / "new.sbusim")
+    source.reload(str(path), background=False)
+    assert source.dataset.peak_locations == ticu.DEFAULT_PEAK_LOCATIONS
+    assert source.dataset.rois.shape == (40, len(ticu.DEFAULT_PEAK_LOCATIONS))
+    assert source.cat is None
+
+
+def test_resample():
+    Q = np.linspace(0, 1, 11)
+    I = np.vstack([Q, 2 * Q + 1])
+    q_grid = np.array([-0.1, 0, 0.25, 1, 1.1])
+    out = ticu.resample(I, Q, q_grid)
+    np.testing.assert_allclose(out[:, 1:-1], [[0, 0.25, 1], [1, 1.5, 3]])
+    assert np.isnan(out[:, [0, -1]]).all()
+
+
+def test_load_heterogeneous_q():
+    fine = synthetic.make_catalog(30, 500, seed=1)
+    coarse = synthetic.make_catalog(20, 300, seed=2)
+    dataset = ticu.load_dataset({**coarse, **fine}, ticu.DEFAULT_PEAK_LOCATIONS)
+    Q = next(iter(fine.values())).primary.read()["Q"]
+    np.testing.assert_array_equal(dataset.Q, Q)
+    assert dataset.I.shape == (50, 500)
+    for j, uid in enumerate(dataset.uids):
+        run = {**coarse, **fine}[uid]
+        p = run.primary.read()
+        np.testing.assert_allclose(dataset.I[j], ticu.resample(p["I"], p["Q"], Q))
+        np.testing.assert_allclose(
+            dataset.rois[j], ticu.reduce_data(run, ticu.DEFAULT_PEAK_LOCATIONS)
+        )
+
+
+def test_load_bad_q():
+    cat = synthetic.make_catalog(5, 100, seed=1)
+    run = next(iter(cat.values()))
+    run.primary = synthetic._Stream({"I": np.ones(100), "Q": np.ones(50)})
+    with pytest.raises(ValueError):
+        ticu.load_dataset(cat)
+
+
+def test_merge_catalogs():
+    first = synthetic.make_catalog(30, 300, seed=1)
+    second = synthetic.make_catalog(20, 200, seed=2)
+    uids = list(first)
+    # a run in both catalogs and a replicate measurement in the second
+    second[uids[0]] = first[uids[0]]
+    start = first[uids[1]].metadata["start"]
+    replicate = synthetic.make_catalog(
+        1, 300, coords=[[start["Ti"], start["anneal_time"], start["temp"]]], seed=3
+    )
+    second.update(replicate)
+
+    dataset = ticu.merge_catalogs([first, second], ticu.DEFAULT_PEAK_LOCATIONS)
+    assert len(dataset) == 50
+    assert dataset.uids[:30] == uids
+    np.testing.assert_array_equal(dataset.Q, first[uids[0]].primary.read()["Q"])
+    (rep_uid,) = replicate
+    assert dataset.provenance["replicates"] == {uids[1]: [uids[1], rep_uid]}
+    np.testing.assert_allclose(
+        dataset.I[1],
+        (first[uids[1]].primary.read()["I"] + replicate[rep_uid].primary.read()["I"])
+        / 2,
+    )
+
+    devices = ticu.make_sim_devices([first, second])
+    assert len(devices["rois"].source.dataset) == 50
+
+
+def test_merge_datasets():
+    first = synthetic.make_dataset(30, 300, seed=1)
+    second = synthetic.make_dataset(20, 200, seed=2)
+    merged = ticu.merge_datasets([first, second, first], duplicates="first")
+    assert len(merged) == 50
+    assert merged.uids == first.uids + second.uids
+    np.testing.assert_array_equal(merged.I[:30], first.I)
+    np.testing.assert_allclose(merged.I[30:], ticu.resample(second.I, second.Q, first.Q))
+
+
+@pytest.mark.parametrize(
+    "how, expected",
+    [("mean", [2, 20]), ("median", [1, 20]), ("first", [1, 20]), ("latest", [4, 20])],
+)
+def test_combine_near_replicates(how, expected):
+    coords = np.array([[0, 0, 0], [10, 10, 10], [0.5, 0, 0], [0.5, 0.9, 0]])
+    I = np.array([[1.0], [20.0], [1.0], [4.0]])
+    dataset = ticu.SimDataset(coords, I, np.array([1.0]), uids=list("abcd"))
+
+    assert ticu.combine_replicates(dataset) is dataset
+    combined = ticu.combine_replicates(dataset, tolerance=1, how=how)
+    np.testing.assert_allclose(combined.I[:, 0], expected)
+    assert combined.uids == ["a", "b"]
+    assert combined.provenance["replicates"] == {"a": ["a", "c", "d"]}
+    # the tolerance can be per axis
+    combined = ticu.combine_replicates(dataset, tolerance=[1, 0.5, 1], how=how)
+    assert combined.uids == ["a", "b", "d"]
+    # and 0 on an axis means it must match exactly
+    combined = ticu.combine_replicates(dataset, tolerance=[1, 0, 1], how=how)
+    assert combined.uids == ["a", "b", "d"]
+    assert combined.provenance["replicates"] == {"a": ["a", "c"]}
+
+
+def test_devices_combine_replicates():
+    dataset = synthetic.make_dataset(40, 200, seed=1)
+    jittered = synthetic.make_dataset(
+        40, 200, coords=dataset.coords + 1e-3, noise=0, seed=1
+    )
+    both = ticu.merge_datasets([dataset, jittered])
+    devices = ticu.make_sim_devices(dataset=both, tolerance=0.01, replicates="first")
+    expected = _read_all(ticu.make_sim_devices(dataset=dataset))
+    actual = _read_all(devices)
+    for k in expected:
+        np.testing.assert_allclose(actual[k], expected[k])
+
+
+class ProjectedStream:
+    """A stream that only allows reading selected columns."""
+
+    def __init__(self, data, log):
+        self._data = data
+        self._log = log
+
+    def read(self):
+        raise AssertionError("read every field")
+
+    def to_dask(self):
+        return self
+
+    def __getitem__(self, key):
+        self._log.append(key)
+        return self._data[key]
+
+
+def test_projected_reads():
+    cat = synthetic.make_catalog(20, 200, seed=1)
+    expected = ticu.load_dataset(cat, ticu.DEFAULT_PEAK_LOCATIONS)
+    log = []
+    for run in cat.values():
+        run.primary = ProjectedStream(
+            {**run.primary.read(), "image": np.zeros((1000, 1000))}, log
+        )
+
+    dataset = ticu.load_dataset(
+        cat, ticu.DEFAULT_PEAK_LOCATIONS, grid_key=lambda h: "same detector"
+    )
+    assert log.count("I") == 20
+    assert log.count("Q") == 1
+    assert "image" not in log
+    np.testing.assert_array_equal(dataset.I, expected.I)
+    np.testing.assert_array_equal(dataset.rois, expected.rois)
+
+
+@pytest.mark.parametrize("dtype, rtol", [(np.float32, 1e-6), (np.float16, 1e-3)])
+def test_reduced_precision(dtype, rtol):
+    cat = synthetic.make_catalog(50, 200, seed=1)
+    dataset = ticu.load_dataset(cat, ticu.DEFAULT_PEAK_LOCATIONS, dtype=dtype)
+    assert dataset.I.dtype == dtype
+    assert dataset.rois.dtype == float
+
+    expected = _read_all(ticu.make_sim_devices(cat))["full_I"]
+    actual = _read_all(ticu.make_sim_devices(cat, dtype=dtype))["full_I"]
+    assert actual.dtype == np.float32
+    np.testing.assert_allclose(actual, expected, atol=rtol * np.abs(expected).max())
+
+
+def test_dataset_reduced_with_other_peaks(tmp_path):
+    dataset = synthetic.make_dataset(40, 300, seed=4)
+    peaks = [1.5, 4.614]
+    expected = ticu.reduce_array(dataset.I, dataset.Q, peaks)
+    path = packed.save(dataset, tmp_path / "peaks.sbusim")
+    for source in [{"dataset": dataset}, {"cat": str(path)}]:
+        devices = ticu.make_sim_devices(peak_locations=peaks, **source)
+        used = devices["rois"].source.dataset
+        assert used.peak_locations == peaks
+        np.testing.assert_allclose(used.rois, expected)
+        devices["ctrl"].Ti.set(42)
+        devices["rois"].trigger()
+        np.testing.assert_allclose(
+            [devices["rois"].I_00.get(), devices["rois"].I_01.get()],
+            ticu.InterpolationCore(dataset.coords, expected)([42, 30, 400])[0],
+        )
+
+    no_rois = ticu.SimDataset(dataset.coords, dataset.I, dataset.Q)
+    with pytest.raises(ValueError):
+        ticu.make_sim_devices(dataset=no_rois)
+
+
+def test_builds_do_not_block_each_other(monkeypatch):
+    cat = synthetic.make_catalog(60, 100, seed=5)
+    uids = list(cat)
+    partial = {uid: cat[uid] for uid in uids[:40]}
+    source = ticu.SimSource(
+        ticu.load_dataset(partial, ticu.DEFAULT_PEAK_LOCATIONS), cat=partial
+    )
+    gate, started = threading.Event(), threading.Event()
+    build_core = ticu._build_core
+
+    def slow_build(dataset, field, *args):
+        if field == "I":
+            started.set()
+            assert gate.wait(10)
+        return build_core(dataset, field, *args)
+
+    monkeypatch.setattr(ticu, "_build_core", slow_build)
+    full = threading.Thread(target=source.full.get)
+    full.start()
+    assert started.wait(10)
+    # the ROIs are built while the full curves are still triangulating
+    assert source.rois([50, 30, 400]).shape == (1, len(ticu.DEFAULT_PEAK_LOCATIONS))
+
+    # runs added during the build end up in the core being built
+    partial.update({uid: cat[uid] for uid in uids[40:]})
+    update = threading.Thread(target=source.update)
+    update.start()
+    gate.set()
+    full.join(10)
+    update.join(10)
+    assert len(source.full.get().coords) == len(source.rois.get().coords) == 60
+
+
+def test_update_without_catalog():
+    source = ticu.SimSource(synthetic.make_dataset(10, 50, seed=1))
+    with pytest.raises(ValueError):
+        source.update()
+    with pytest.raises(ValueError):
+        source.watch()
+
+
+@pytest.mark.parametrize("snapshot_first", [False, True])
+@pytest.mark.parametrize("field", ["I", "rois"])
+def test_reload_during_first_build(monkeypatch, snapshot_first, field):
+    devices = ticu.make_sim_devices(
+        synthetic.make_catalog(50, 200, seed=1), background=False
+    )
+    ctrl = devices["ctrl"]
+    ctrl.Ti.set(42)
+    det = devices["full" if field == "I" else "rois"]
+    source = det.source
+    original = source._dataset
+    gate, started = threading.Event(), threading.Event()
+
+    def gated(build):
+        def inner(*args):
+            if not gate.is_set():
+                started.set()
+                assert gate.wait(10)
+            return build(*args)
+
+        return inner
+
+    if snapshot_first:
+        # the build has read the old dataset before the swap
+        build_core = ticu._build_core
+        monkeypatch.setattr(
+            ticu,
+            "_build_core",
+            lambda dataset, k, *args: (
+                gated(build_core) if k == field else build_core
+            )(dataset, k, *args),
+        )
+    else:
+        # the build has the core's lock but not yet the source's
+        core = source.full if field == "I" else source.rois
+        core._build = gated(core._build)
+    read = []
+
+    def trigger():
+        det.trigger()
+        read.append({k: v["value"] for k, v in det.read().items()})
+
+    triggering = threading.Thread(target=trigger, daemon=True)
+    triggering.start()
+    assert started.wait(10)
+    reload = source.reload(synthetic.make_catalog(60, 300, seed=2))
+    for _ in range(1000):
+        if source._dataset is not original:
+            break
+        time.sleep(0.01)
+    gate.set()
+    triggering.join(10)
+    assert not triggering.is_alive()
+    new = reload.result(10)
+    assert new.I.shape == (60, 300)
+    # whichever data the trigger used, all of its values came from the same one
+    (values,) = read
+    if field == "I":
+        assert values["full_I"].shape == values["full_Q"].shape
+
+        det.trigger()
+        assert det.I.get().shape == det.Q.get().shape == (300,)
+        with pytest.raises(ReadOnlyError):
+            det.Q.put(np.zeros(300))
+    else:
+        n_peaks = len(new.peak_locations)
+        rois = [values[f"rois_I_{j:02d}"] for j in range(n_peaks)]
+        position = [
+            ctrl.Ti.readback.get(),
+            ctrl.anneal_time.readback.get(),
+            ctrl.temp.readback.get(),
+        ]
+        assert any(
+            np.allclose(rois, ticu._build_core(dataset, "rois")(position).squeeze())
+            for dataset in (original, new)
+        )
+
+
+def test_rois_of_a_trigger_from_one_dataset():
+    dataset = synthetic.make_dataset(50, 200, seed=1)
+    devices = ticu.make_sim_devices(dataset=dataset, background=False)
+    rois = devices["rois"]
+    rois.trigger()
+    before = [rois.I_00.get(), rois.I_01.get()]
+    scaled = ticu.SimDataset(
+        dataset.coords,
+        10 * dataset.I,
+        dataset.Q,
+        peak_locations=dataset.peak_locations,
+        uids=dataset.uids,
+    )
+    reloads = []
+
+    def reload_once(**kwargs):
+        # swap the data between the first ROI and the rest
+        if not reloads:
+            reloads.append(rois.source.reload(scaled, background=False))
+
+    rois.I_00.subscribe(reload_once, run=False)
+    rois.trigger()
+    assert reloads
+    np.testing.assert_allclose([rois.I_00.get(), rois.I_01.get()], before)
+    rois.trigger()
+    np.testing.assert_allclose(
+        [rois.I_00.get(), rois.I_01.get()], np.multiply(before, 10)
+    )
@@ -0,0 +1,37 @@
+import json
+
+import numpy as np
+from bluesky import RunEngine
+
+from sbu_sim import ticu, trace
+from sbu_sim.adaptive_integration import (
+    StepAdaptive,
+    per_event_adaptive_plan,
+    per_event_plan_gpcam_factory,
+)
+
+
+def test_trace_plan(ticu_cat, tmp_path):
+    devices = ticu.make_sim_devices(ticu_cat)
+    ctrl, rois = devices["ctrl"], devices["rois"]
+    cb, queue = per_event_plan_gpcam_factory(
+        StepAdaptive(np.array([1.0, 1.0, 1.0])),
+        ["ctrl_Ti", "ctrl_anneal_time", "ctrl_temp"],
+        ["rois_I_00"],
+        max_count=2,
+    )
+    plan = per_event_adaptive_plan(
+        [rois],
+        {ctrl.Ti: 10, ctrl.anneal_time: 5, ctrl.temp: 320},
+        to_brains=cb,
+        from_brains=queue,
+    )
+    path = tmp_path / "trace.json"
+    RunEngine({})(trace.trace_plan(plan, str(path)))
+    assert trace.get_tracer() is None
+
+    with open(path) as fin:
+        events = json.load(fin)["traceEvents"]
+    names = {ev["name"] for ev in events if ev["ph"] == "X"}
+    assert {"move", "read", "wait", "tell", "ask", "interpolate", "trigger rois"} <= names
+    assert any(ev["ph"] == "M" for ev in events)
@@ -1,8 +1,40 @@
-from ophyd import Device, Component as Cpt
-from ophyd.sim import SynAxis, SynSignalRO, SynSignal
+from __future__ import annotations
+
 import numpy as np
-import scipy.interpolate
 import functools
+import itertools
+import logging
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import TYPE_CHECKING
+
+from . import trace
+
+# ophyd and scipy.interpolate are slow to import, only pay for them when
+# the devices are built
+if TYPE_CHECKING:
+    from ophyd import Device
+
+logger = logging.getLogger(__name__)
+
+# a unique token for each state of each InterpolationCore, used to
+# invalidate caches of interpolated values
+_generations = itertools.count()
+
+DEFAULT_PEAK_LOCATIONS = [
+    1.540,  #
+    2.665,  # *
+    2.945,  # *
+    3.077,  # *
+    3.549,  #
+    3.775,  #
+    3.870,  #
+    4.614,  # *
+    5.019,  #
+    5.323,  #
+    5.330,  #
+]
 
 
 def extract_coords(h, *, composition_component="Ti"):
@@ -24,6 +56,39 @@ def extract_coords(h, *, composition_component="Ti"):
     )
 
 
+def read_fields(h, fields, *, stream="primary"):
+    """
+    Read only some of the fields of a stream.
+
+    Where the stream supports it, this goes through ``to_dask()`` so
+    that only the requested columns are loaded, rather than every field
+    (e.g. raw images) as ``read()`` does.
+
+    Parameters
+    ----------
+    h : BlueskyRun
+        The Run to pull the data from
+
+    fields : List[str]
+        The fields to read
+
+    stream : str, default 'primary'
+        The stream to read from
+
+    Returns
+    -------
+    Dict[str, array]
+        The data of each field
+    """
+    s = getattr(h, stream)
+    if hasattr(s, "to_dask"):
+        data = s.to_dask()
+        # only the selected variables are computed
+        return {k: np.asarray(data[k]) for k in fields}
+    data = s.read()
+    return {k: np.asarray(data[k]) for k in fields}
+
+
 def reduce_data(h, peak_locations, *, window_half_width=3):
     """
     Reduce a I(Q) curve to a handful of scalars.
@@ -48,18 +113,863 @@ def reduce_data(h, peak_locations, *, window_half_width=3):
     array
         The scalars extracted from the I(Q) curve.
     """
-    p = h.primary.read()
-    I = p["I"]
-    Q = p["Q"]
+    p = read_fields(h, ["I", "Q"])
+    return reduce_array(
+        np.asarray(p["I"]), p["Q"], peak_locations, window_half_width=window_half_width
+    )
+
+
+def reduce_array(I, Q, peak_locations, *, window_half_width=3):
+    """
+    Reduce I(Q) curves to a handful of scalars.
+
+    This is the same reduction as `reduce_data`, but works on the curves
+    directly, either a single curve or a stack of them sharing a Q grid.
+
+    Parameters
+    ----------
+    I : array[float]
+        The (nQ,) curve or (N, nQ) stack of curves
+
+    Q : array[float]
+        The (nQ,) Q values of the curves
+
+    peak_locations : array[float]
+        The locations in Q space to sum around
+
+    window_half_width : int, default=3
+        The half-width of the window.
+
+    Returns
+    -------
+    array
+        (len(peak_locations),) or (N, len(peak_locations)) array of the
+        summed intensities.
+    """
     out = []
     indxes = np.searchsorted(Q, peak_locations)
     for indx in indxes:
-        peak = np.array(I[indx - window_half_width : indx + window_half_width + 1])
-        out.append(np.sum(peak))
-    return np.array(out)
+        peak = I[..., indx - window_half_width : indx + window_half_width + 1]
+        out.append(np.sum(peak, axis=-1))
+    return np.stack(out, axis=-1)
 
 
-def make_full_IofQ_detector(ctrl: Device, *, cat, name: str) -> Device:
+def resample(I, Q, q_grid):
+    """
+    Linearly resample I(Q) curves onto a different Q grid.
+
+    Parameters
+    ----------
+    I : array[float]
+        The (nQ,) curve or (N, nQ) stack of curves
+
+    Q : array[float]
+        The (nQ,) increasing Q values shared by the curves
+
+    q_grid : array[float]
+        The (M,) Q values to resample onto
+
+    Returns
+    -------
+    array[float]
+        (M,) or (N, M) array of the resampled curves, NaN outside of the
+        range of *Q*.
+    """
+    I = np.asarray(I, dtype=float)
+    Q = np.asarray(Q, dtype=float)
+    q_grid = np.asarray(q_grid, dtype=float)
+    # the same weights apply to every curve
+    indx = np.clip(np.searchsorted(Q, q_grid), 1, len(Q) - 1)
+    weight = (q_grid - Q[indx - 1]) / (Q[indx] - Q[indx - 1])
+    out = I[..., indx - 1] * (1 - weight) + I[..., indx] * weight
+    out[..., (q_grid < Q[0]) | (q_grid > Q[-1])] = np.nan
+    return out
+
+
+def _group_by_grid(Qs):
+    """Map each distinct Q grid to the indices of the runs measured on it."""
+    groups = {}
+    keys = {}
+    for j, Q in enumerate(Qs):
+        # only hash each shared array once
+        if id(Q) not in keys:
+            keys[id(Q)] = (Q.dtype.str, Q.tobytes())
+        groups.setdefault(keys[id(Q)], []).append(j)
+    return list(groups.values())
+
+
+def _check_grid(Q, I, uid):
+    if Q.ndim != 1 or Q.shape != I.shape[-1:]:
+        raise ValueError(
+            f"Run {uid} has Q with shape {Q.shape} but I with shape {I.shape}"
+        )
+    if np.any(np.diff(Q) <= 0):
+        raise ValueError(f"The Q of run {uid} is not strictly increasing")
+
+
+def reduce_catalog(cat, peak_locations, *, reduce_function=reduce_data):
+    """
+    Extract the coordinates and reduced values of every run in a catalog.
+
+    This is the training data a recommendation engine needs, see
+    `sbu_sim.adaptive_integration.warm_start`.
+
+    Parameters
+    ----------
+    cat : Catalog
+        The source of the experimental data
+
+    peak_locations : array[float]
+        The locations in Q space to look for features
+
+    reduce_function : Callable[[BlueskyRun, array[float]], array[float]]
+        The function used to reduce the I(Q) curves to ROI values.
+
+    Returns
+    -------
+    coords : array[float]
+        (N, 3) array of the (Ti, anneal_time, temp) of each run
+
+    reduced : array[float]
+        (N, len(peak_locations)) array of the reduced values
+    """
+    data = [cat[uid] for uid in cat]
+    return (
+        np.vstack([extract_coords(h) for h in data]),
+        np.vstack([reduce_function(h, peak_locations) for h in data]),
+    )
+
+
+class SimDataset:
+    """The arrays extracted from a catalog that the simulation interpolates."""
+
+    def __init__(
+        self,
+        coords,
+        I,
+        Q,
+        *,
+        rois=None,
+        peak_locations=None,
+        uids=None,
+        provenance=None,
+        triangulation=None,
+    ):
+        """
+
+        Parameters
+        ----------
+        coords : array[float]
+            (N, 3) array of the (Ti, anneal_time, temp) of each run
+
+        I : array[float]
+            (N, nQ) array of the I(Q) curve of each run
+
+        Q : array[float]
+            (nQ,) array of the Q values shared by all of the runs
+
+        rois : array[float], optional
+            (N, len(peak_locations)) array of the reduced values of each run
+
+        peak_locations : array[float], optional
+            The peak locations *rois* was reduced with
+
+        uids : List[str], optional
+            The uid of each run
+
+        provenance : dict, optional
+            Where the data came from
+
+        triangulation : scipy.spatial.Delaunay, optional
+            A triangulation of *coords* to reuse rather than computing one,
+            e.g. from a shared packed file, see `sbu_sim.packed.publish`.
+        """
+        self.coords = coords
+        self.I = I
+        self.Q = Q
+        self.rois = rois
+        self.peak_locations = peak_locations
+        self.uids = uids
+        self.provenance = provenance or {}
+        self.triangulation = triangulation
+
+    def __len__(self):
+        return len(self.coords)
+
+
+def load_dataset(
+    cat,
+    peak_locations=None,
+    *,
+    reduce_function=reduce_data,
+    q_grid=None,
+    grid_key=None,
+    dtype=None,
+):
+    """
+    Extract the arrays needed for the simulation from a catalog.
+
+    The runs do not need to share a Q grid.  The runs are grouped by
+    grid and the curves of each group are resampled onto the common grid
+    at once, see `resample`.
+
+    Parameters
+    ----------
+    cat : Catalog
+        The source of the experimental data
+
+    peak_locations : array[float], optional
+        If given, also reduce each run with *reduce_function*
+
+    reduce_function : Callable[[BlueskyRun, array[float]], array[float]]
+        The function used to reduce the I(Q) curves to ROI values.
+        `reduce_data` is applied to each group of runs at once, on the
+        grid they were measured on.
+
+    q_grid : array[float], optional
+        The Q grid to put all of the curves on.  Defaults to the grid
+        shared by the most runs.
+
+    grid_key : Callable[[BlueskyRun], Hashable], optional
+        Runs with the same key are known to share a Q grid, so Q is only
+        read from the first of them, e.g.
+        ``lambda h: h.metadata['start']['detector_distance']``.  By
+        default Q is read from every run.
+
+    dtype : dtype, optional
+        Store the curves with this dtype, e.g. ``np.float32`` or
+        ``np.float16`` to halve or quarter the memory.  Curves stored at
+        reduced precision are interpolated in float32, see
+        `OutOfCoreInterpolationCore`.
+
+    Returns
+    -------
+    SimDataset
+    """
+    return _assemble(
+        *_read_runs(cat, grid_key),
+        peak_locations,
+        reduce_function=reduce_function,
+        q_grid=q_grid,
+        dtype=dtype,
+    )
+
+
+def _read_runs(cat, grid_key=None):
+    """Read the uid, BlueskyRun, I and Q of each run in *cat*."""
+    uids = list(cat)
+    # get the BlueskyRun instances
+    data = [cat[uid] for uid in uids]
+    grids = {}
+    Is, Qs = [], []
+    for h in data:
+        key = grid_key(h) if grid_key is not None else object()
+        if key in grids:
+            Is.append(read_fields(h, ["I"])["I"])
+        else:
+            p = read_fields(h, ["I", "Q"])
+            Is.append(p["I"])
+            grids[key] = p["Q"]
+        # runs on the same grid share the array
+        Qs.append(grids[key])
+    return uids, data, Is, Qs
+
+
+def _assemble(
+    uids, data, Is, Qs, peak_locations, *, reduce_function, q_grid, dtype=None
+):
+    """Put the curves read by `_read_runs` on one grid, see `load_dataset`."""
+    groups = _group_by_grid(Qs)
+    for indxes in groups:
+        _check_grid(Qs[indxes[0]], Is[indxes[0]], uids[indxes[0]])
+
+    if q_grid is None:
+        q_grid = Qs[max(groups, key=len)[0]]
+    q_grid = np.asarray(q_grid)
+    if len(groups) == 1 and np.array_equal(Qs[0], q_grid):
+        I = np.vstack(Is).astype(dtype or Is[0].dtype, copy=False)
+    else:
+        I = np.empty((len(data), len(q_grid)), dtype=dtype or float)
+        for indxes in groups:
+            stacked = np.vstack([Is[j] for j in indxes])
+            if np.array_equal(Qs[indxes[0]], q_grid):
+                I[indxes] = stacked
+            else:
+                I[indxes] = resample(stacked, Qs[indxes[0]], q_grid)
+
+    rois = None
+    if peak_locations is not None:
+        if reduce_function is reduce_data:
+            rois = np.empty((len(data), len(peak_locations)))
+            for indxes in groups:
+                rois[indxes] = reduce_array(
+                    np.vstack([Is[j] for j in indxes]),
+                    Qs[indxes[0]],
+                    peak_locations,
+                )
+        else:
+            rois = np.vstack([reduce_function(h, peak_locations) for h in data])
+    return SimDataset(
+        np.vstack([extract_coords(h) for h in data]),
+        I,
+        q_grid,
+        rois=rois,
+        peak_locations=peak_locations,
+        uids=uids,
+    )
+
+
+def _cluster(coords, tolerance=0):
+    """
+    Label the runs so that runs within *tolerance* of each other share a label.
+
+    Runs are linked if they are within *tolerance* on every axis, and
+    clusters are the connected groups of linked runs.  An axis with a
+    tolerance of 0 must match exactly.  The labels are
+    numbered in the order of the first run in each cluster.
+
+    Returns
+    -------
+    labels : array[int]
+        The cluster of each run
+
+    n : int
+        The number of clusters
+    """
+    coords = np.asarray(coords, dtype=float)
+    tolerance = np.asarray(tolerance, dtype=float)
+    if not np.any(tolerance):
+        _, inverse = np.unique(coords, axis=0, return_inverse=True)
+        labels = inverse.reshape(-1)
+    else:
+        from scipy.sparse import coo_matrix
+        from scipy.sparse.csgraph import connected_components
+        from scipy.spatial import cKDTree
+
+        tolerance = np.broadcast_to(tolerance, coords.shape[1:])
+        exact = tolerance == 0
+        scaled = np.empty_like(coords)
+        scaled[:, ~exact] = coords[:, ~exact] / tolerance[~exact]
+        # runs must match exactly on the axes with no tolerance, number the
+        # distinct values 2 apart so they are never within 1
+        for j in np.flatnonzero(exact):
+            _, inverse = np.unique(coords[:, j], return_inverse=True)
+            scaled[:, j] = 2 * inverse.reshape(-1)
+        pairs = cKDTree(scaled).query_pairs(1, p=np.inf, output_type="ndarray")
+        graph = coo_matrix(
+            (np.ones(len(pairs)), (pairs[:, 0], pairs[:, 1])),
+            shape=(len(coords),) * 2,
+        )
+        _, labels = connected_components(graph, directed=False)
+    _, first = np.unique(labels, return_index=True)
+    rank = np.empty(len(first), dtype=int)
+    rank[np.argsort(first)] = np.arange(len(first))
+    return rank[labels], len(first)
+
+
+def _aggregate(values, labels, n, how):
+    """Combine the rows of *values* with the same label, see `combine_replicates`."""
+    values = np.asarray(values)
+    order = np.argsort(labels, kind="stable")
+    starts = np.searchsorted(labels[order], np.arange(n))
+    counts = np.diff(np.append(starts, len(labels)))
+    if how == "first":
+        return values[order[starts]]
+    if how == "latest":
+        return values[order[starts + counts - 1]]
+    # keep reduced precision data at reduced precision
+    dtype = values.dtype if np.issubdtype(values.dtype, np.floating) else float
+    if how == "mean":
+        sums = np.add.reduceat(values[order], starts, axis=0, dtype=float)
+        means = sums / counts.reshape((-1,) + (1,) * (values.ndim - 1))
+        return means.astype(dtype, copy=False)
+    # the median of each size of cluster at once
+    out = np.empty((n,) + values.shape[1:], dtype=dtype)
+    for size in np.unique(counts):
+        groups = np.flatnonzero(counts == size)
+        members = order[starts[groups, None] + np.arange(size)]
+        out[groups] = np.median(values[members], axis=1)
+    return out
+
+
+REPLICATES = ("mean", "median", "first", "latest")
+
+
+def combine_replicates(dataset, *, tolerance=0, how="mean"):
+    """
+    Combine runs measured at the same, or nearly the same, coordinates.
+
+    Repeated points make degenerate simplices in the triangulation and
+    near-repeats make slivers, so replicate measurements are combined
+    into one point before building the interpolation.
+
+    Parameters
+    ----------
+    dataset : SimDataset
+        The data to combine
+
+    tolerance : float or array[float], default 0
+        Runs within this distance on every axis of (Ti, anneal_time, temp)
+        are combined, chaining through intermediate runs.  0 only combines
+        exact replicates.
+
+    how : {'mean', 'median', 'first', 'latest'}
+        How to combine the coordinates and curves (and ROIs) of
+        replicates.  'latest' keeps the last run in the dataset.
+
+    Returns
+    -------
+    SimDataset
+        The combined data, ordered by the first run in each cluster.  The
+        uid of the first run is kept and ``provenance['replicates']`` maps
+        it to the uids of all of the runs that were combined.
+    """
+    if how not in REPLICATES:
+        raise ValueError(f"how must be one of {REPLICATES}, not {how!r}")
+    labels, n = _cluster(dataset.coords, tolerance)
+    if n == len(dataset):
+        return dataset
+
+    def combine(values):
+        return None if values is None else _aggregate(values, labels, n, how)
+
+    uids = dataset.uids
+    provenance = dict(dataset.provenance)
+    if uids is not None:
+        replicates = [[] for _ in range(n)]
+        for label, uid in zip(labels, uids):
+            replicates[label].append(uid)
+        provenance["replicates"] = {
+            group[0]: group for group in replicates if len(group) > 1
+        }
+        uids = [group[0] for group in replicates]
+    return SimDataset(
+        combine(dataset.coords),
+        combine(dataset.I),
+        dataset.Q,
+        rois=combine(dataset.rois),
+        peak_locations=dataset.peak_locations,
+        uids=uids,
+        provenance=provenance,
+    )
+
+
+def _build_core(dataset, field, tolerance=None, how="mean"):
+    """Build the interpolation of *field*, combining replicates if asked to."""
+    coords, values = dataset.coords, getattr(dataset, field)
+    tri = getattr(dataset, "triangulation", None)
+    if tolerance is not None:
+        labels, n = _cluster(coords, tolerance)
+        if n < len(coords):
+            coords = _aggregate(coords, labels, n, how)
+            values = _aggregate(values, labels, n, how)
+            tri = None
+    # LinearNDInterpolator would make a float64 copy of everything
+    if (
+        isinstance(values, np.memmap)
+        or not isinstance(values, np.ndarray)
+        or values.dtype != float
+    ):
+        core = OutOfCoreInterpolationCore(coords, values, tri=tri)
+    else:
+        core = InterpolationCore(coords, values, tri=tri)
+    # remember what is interpolated, so readers can get the matching Q
+    core.dataset = dataset
+    return core
+
+
+def merge_datasets(datasets, *, duplicates="mean", q_grid=None):
+    """
+    Merge several datasets into one.
+
+    Runs are de-duplicated first by uid, keeping the first copy, and then
+    by coordinate with `combine_replicates`.
+
+    Parameters
+    ----------
+    datasets : List[SimDataset]
+        The datasets to merge, reduced with the same peak locations
+
+    duplicates : {'mean', 'median', 'first', 'latest'}
+        How to combine runs at the same coordinates
+
+    q_grid : array[float], optional
+        The Q grid to put all of the curves on.  Defaults to the grid of
+        the largest dataset.
+
+    Returns
+    -------
+    SimDataset
+    """
+    peak_locations = datasets[0].peak_locations
+    for dataset in datasets[1:]:
+        if not np.array_equal(dataset.peak_locations, peak_locations):
+            raise ValueError("The datasets were reduced with different peaks")
+    if q_grid is None:
+        q_grid = max(datasets, key=len).Q
+    q_grid = np.asarray(q_grid)
+
+    seen = set()
+    coords, I, rois, uids = [], [], [], []
+    for dataset in datasets:
+        ds_uids = dataset.uids or [None] * len(dataset)
+        mask = np.array([uid is None or uid not in seen for uid in ds_uids])
+        seen.update(ds_uids)
+        coords.append(np.asarray(dataset.coords)[mask])
+        if np.array_equal(dataset.Q, q_grid):
+            I.append(np.asarray(dataset.I)[mask])
+        else:
+            I.append(resample(np.asarray(dataset.I)[mask], dataset.Q, q_grid))
+        if dataset.rois is not None:
+            rois.append(np.asarray(dataset.rois)[mask])
+        uids.extend(uid for uid, m in zip(ds_uids, mask) if m)
+
+    merged = SimDataset(
+        np.vstack(coords),
+        np.vstack(I),
+        q_grid,
+        rois=np.vstack(rois) if len(rois) == len(datasets) else None,
+        peak_locations=peak_locations,
+        uids=uids,
+        provenance={"merged": [dataset.provenance for dataset in datasets]},
+    )
+    return combine_replicates(merged, how=duplicates)
+
+
+def merge_catalogs(
+    cats,
+    peak_locations=None,
+    *,
+    reduce_function=reduce_data,
+    duplicates="mean",
+    q_grid=None,
+    grid_key=None,
+    max_workers=None,
+    dtype=None,
+):
+    """
+    Load several catalogs, e.g. from different beamtimes, as one dataset.
+
+    The catalogs are read in parallel threads.  Runs are de-duplicated
+    first by uid, keeping the first copy, and then by coordinate with
+    `combine_replicates`.  As in `load_dataset`, each run is resampled
+    at most once, from the grid it was measured on to the common grid.
+
+    Parameters
+    ----------
+    cats : List[Catalog]
+        The sources of the experimental data
+
+    peak_locations : array[float], optional
+        If given, also reduce each run with *reduce_function*
+
+    reduce_function : Callable[[BlueskyRun, array[float]], array[float]]
+        The function used to reduce the I(Q) curves to ROI values.
+
+    duplicates : {'mean', 'median', 'first', 'latest'}
+        How to combine runs at the same coordinates
+
+    q_grid : array[float], optional
+        The Q grid to put all of the curves on.  Defaults to the grid
+        shared by the most runs.
+
+    grid_key : Callable[[BlueskyRun], Hashable], optional
+        Runs with the same key are known to share a Q grid, so Q is only
+        read from the first of them, e.g.
+        ``lambda h: h.metadata['start']['detector_distance']``.  By
+        default Q is read from every run.
+
+    max_workers : int, optional
+        The number of catalogs to read at once
+
+    dtype : dtype, optional
+        Store the curves with this dtype, e.g. ``np.float32`` or
+        ``np.float16`` to halve or quarter the memory.  Curves stored at
+        reduced precision are interpolated in float32, see
+        `OutOfCoreInterpolationCore`.
+
+    Returns
+    -------
+    SimDataset
+    """
+    with ThreadPoolExecutor(max_workers, thread_name_prefix="sbu_sim-merge") as ex:
+        read = list(ex.map(functools.partial(_read_runs, grid_key=grid_key), cats))
+
+    seen = set()
+    runs = []
+    for uids, *columns in read:
+        for uid, *run in zip(uids, *columns):
+            if uid not in seen:
+                seen.add(uid)
+                runs.append((uid, *run))
+    dataset = _assemble(
+        *map(list, zip(*runs)),
+        peak_locations,
+        reduce_function=reduce_function,
+        q_grid=q_grid,
+        dtype=dtype,
+    )
+    dataset.provenance["catalogs"] = len(cats)
+    return combine_replicates(dataset, how=duplicates)
+
+
+def _resolve(obj):
+    """
+    Wait for *obj* if it is a `Future` still being computed in the background.
+
+    For a `SimSource` return its current dataset.
+    """
+    if isinstance(obj, Future):
+        return obj.result()
+    if isinstance(obj, SimSource):
+        return obj.dataset
+    return obj
+
+
+class InterpolationCore:
+    """
+    Batched interpolation of measured values at (Ti, anneal_time, temp).
+
+    This uses `scipy.interpolate.LinearNDInterpolator` to do the
+    interpolation which in turn triangulates the input and then uses
+    linear barycentric interpolation.
+
+    New measurements can be added with `extend`, which updates the
+    triangulation in place.
+    """
+
+    def __init__(self, coords, values, *, tri=None):
+        """
+
+        Parameters
+        ----------
+        coords : array[float]
+            (N, 3) array of the measured positions
+
+        values : array[float]
+            (N, M) array of the values measured at each position
+
+        tri : scipy.spatial.Delaunay, optional
+            An existing triangulation of *coords* to use.  It is only read,
+            so it may be shared with other cores or processes.
+        """
+        self.coords = np.asarray(coords, dtype=float)
+        self.values = _as_values(values)
+        # changes whenever the interpolation does
+        self.generation = next(_generations)
+        # the incremental triangulation, made by the first `extend`
+        self._tri = None
+        self._lock = threading.Lock()
+        self._interpolator = self._make_interpolator(
+            self.coords if tri is None else tri, self.values
+        )
+
+    def _make_interpolator(self, tri, values):
+        import scipy.interpolate
+
+        return scipy.interpolate.LinearNDInterpolator(tri, values)
+
+    def extend(self, coords, values):
+        """
+        Add new measurements to the interpolation.
+
+        The first call re-triangulates all of the points with Qhull in
+        incremental mode, after that only the new points are added.
+
+        Parameters
+        ----------
+        coords : array[float]
+            (N + K, 3) array of all of the measured positions, the first N
+            must be the positions already in the interpolation.
+
+        values : array[float]
+            (N + K, M) array of the values measured at each position
+        """
+        import scipy.spatial
+
+        coords = np.asarray(coords, dtype=float)
+        values = _as_values(values)
+        with self._lock, trace.span("extend interpolation", "ticu"):
+            if self._tri is None:
+                self._tri = scipy.spatial.Delaunay(coords, incremental=True)
+            else:
+                self._tri.add_points(coords[len(self.coords) :])
+            # re-using the triangulation makes this cheap
+            self._interpolator = self._make_interpolator(self._tri, values)
+            self.coords = coords
+            self.values = values
+            self.generation = next(_generations)
+
+    def __call__(self, points):
+        """
+        Interpolate the values at *points*.
+
+        Parameters
+        ----------
+        points : array[float]
+            (K, 3) array of positions, or a single (3,) position.
+
+        Returns
+        -------
+        array[float]
+            (K, M) array of interpolated values, NaN outside of the
+            convex hull of the measurements.
+        """
+        with self._lock, trace.span("interpolate", "ticu"):
+            return self._interpolator(points)
+
+
+def _as_values(values):
+    # leave memory maps and dask arrays alone, np.asarray would load them
+    return values if hasattr(values, "shape") else np.asarray(values)
+
+
+def _barycentric(tri, values, points, dtype=float):
+    """
+    Linearly interpolate *values* at *points*, only reading the rows needed.
+
+    Parameters
+    ----------
+    tri : scipy.spatial.Delaunay
+        The triangulation of the measured positions
+
+    values : array-like
+        (N, M) values at the vertices of *tri*, anything that supports
+        indexing rows with an integer array
+
+    points : array[float]
+        (..., 3) positions to interpolate at
+
+    dtype : dtype, default float
+        The precision to blend the values in
+    """
+    points = np.asarray(points, dtype=float)
+    shape = points.shape[:-1] if points.ndim > 1 else (1,)
+    points = points.reshape(-1, points.shape[-1])
+    simplex = tri.find_simplex(points)
+    inside = simplex >= 0
+    out = np.full((len(points),) + values.shape[1:], np.nan, dtype=dtype)
+    if inside.any():
+        transform = tri.transform[simplex[inside]]
+        bary = np.einsum(
+            "kij,kj->ki", transform[:, :-1], points[inside] - transform[:, -1]
+        )
+        weights = np.column_stack([bary, 1 - bary.sum(axis=1)]).astype(dtype)
+        vertices = tri.simplices[simplex[inside]]
+        if vertices.size > 64:
+            # read each needed row once, in file order
+            rows, inverse = np.unique(vertices, return_inverse=True)
+            gathered = np.asarray(values[rows], dtype=dtype)[
+                inverse.reshape(vertices.shape)
+            ]
+        else:
+            # for a few points sorting costs more than it saves
+            gathered = np.asarray(values[vertices.ravel()], dtype=dtype).reshape(
+                vertices.shape + values.shape[1:]
+            )
+        out[inside] = np.einsum("kv,kv...->k...", weights, gathered)
+    return out.reshape(shape + values.shape[1:])
+
+
+class OutOfCoreInterpolationCore(InterpolationCore):
+    """
+    Linear interpolation that only reads the values it needs.
+
+    Only the coordinates are triangulated.  For each call the simplices
+    containing the points are found and only the rows of *values* at
+    their vertices are read.  Use this when the values are a
+    `numpy.memmap` or dask array too large for memory, or are stored at
+    reduced precision.
+
+    Values stored as float32 or float16 are blended, and returned, as
+    float32.  Anything else is blended as float64.
+    """
+
+    def _make_interpolator(self, tri, values):
+        import scipy.spatial
+
+        if not isinstance(tri, scipy.spatial.Delaunay):
+            tri = scipy.spatial.Delaunay(tri)
+        dtype = np.float32 if values.dtype in (np.float16, np.float32) else float
+        return functools.partial(_barycentric, tri, values, dtype=dtype)
+
+
+class LazyInterpolationCore:
+    """
+    An `InterpolationCore` that is built the first time it is used.
+
+    Concurrent first callers wait on a lock for a single build rather than
+    each triangulating the data.  If the build fails the next call tries
+    again.
+    """
+
+    def __init__(self, build):
+        """
+
+        Parameters
+        ----------
+        build : Callable[[], InterpolationCore]
+            Called, at most once successfully, to make the core
+        """
+        self._build = build
+        self._core = None
+        self._lock = threading.Lock()
+
+    @property
+    def built(self):
+        """If the core has been built."""
+        return self._core is not None
+
+    @property
+    def generation(self):
+        """The generation of the built core, see `InterpolationCore`."""
+        return self.get().generation
+
+    def get(self):
+        """Return the core, building it if needed."""
+        if self._core is None:
+            with self._lock:
+                # someone else may have built it while we waited
+                if self._core is None:
+                    with trace.span("build interpolation", "ticu"):
+                        self._core = self._build()
+        return self._core
+
+    def replace(self, update):
+        """
+        Replace a built core with ``update(core)``, holding the lock.
+
+        A build in progress is waited for first.  Does nothing if the core
+        has not been built.
+        """
+        with self._lock:
+            if self._core is not None:
+                self._core = update(self._core)
+
+    def reset(self, core=None):
+        """
+        Replace the core.
+
+        Triggers already interpolating finish with the old core.  If
+        *core* is None the next use calls *build* again.
+        """
+        with self._lock:
+            self._core = core
+
+    def __call__(self, points):
+        return self.get()(points)
+
+
+def make_full_IofQ_detector(
+    ctrl: Device,
+    *,
+    cat=None,
+    name: str,
+    dataset: SimDataset | Future = None,
+    core: InterpolationCore | Future = None,
+    tolerance=None,
+    replicates: str = "mean",
+) -> Device:
     """
     Simulated detector that provides the full I(Q) curve.
 
@@ -75,10 +985,25 @@ def make_full_IofQ_detector(ctrl: Device, *, cat, name: str) -> Device:
     ctrl : Device
         Much have the components *Ti*, *anneal_time*, *temp* and each
         of those must have the component *readback* who's value is a float.
-    cat : Catalog
+    cat : Catalog, optional
         The source of the experimental data we need to interpolate
     name : str
         The base name of the created device
+    dataset : SimDataset or Future or SimSource, optional
+        The already extracted data to interpolate, used instead of *cat*.
+        If a `Future` (see `make_sim_devices`), the device can be created
+        before the data is loaded.  If a `SimSource`, *Q* follows its
+        current dataset.  With *core* given, anything with a *Q*
+        attribute, such as a `sbu_sim.server.SimClient`, also works.
+    core : InterpolationCore or LazyInterpolationCore or Future, optional
+        The interpolation of ``dataset.I``.  If not given, it is built from
+        *dataset* on the first trigger.
+    tolerance : float or array[float], optional
+        If given, combine runs within this distance of each other on every
+        axis before building the interpolation, see `combine_replicates`.
+        0 combines exact replicates only.
+    replicates : {'mean', 'median', 'first', 'latest'}
+        How to combine the replicates
 
     Returns
     -------
@@ -87,17 +1012,19 @@ def make_full_IofQ_detector(ctrl: Device, *, cat, name: str) -> Device:
         I(Q) curve interpolated.
 
     """
-    # get the BlueskyRun instances
-    data = [cat[uid] for uid in cat]
-    # extract the measured control parameters, and setup the
-    # interpolation
-    full_interpolation = scipy.interpolate.LinearNDInterpolator(
-        np.vstack([extract_coords(h) for h in data]),
-        np.vstack([h.primary.read()["I"] for h in data]),
-    )
+    from ophyd import Device, Signal, Component as Cpt
+    from ophyd.sim import NullStatus, SynSignal, SynSignalRO
 
-    # we are assuming that the Q is the same for all of these!
-    Q_data = np.array(data[0].primary.read()["Q"])
+    if dataset is None:
+        dataset = load_dataset(cat)
+    # setup the interpolation from the measured control parameters
+    if core is None:
+        core = LazyInterpolationCore(
+            lambda: _build_core(_resolve(dataset), "I", tolerance, replicates)
+        )
+
+    # the Q of the last interpolation
+    current = {}
 
     # helper to do the resampling based on the current positions
     # of the controls
@@ -109,26 +1036,62 @@ def make_full_IofQ_detector(ctrl: Device, *, cat, name: str) -> Device:
                 ctrl.temp.readback.get(),
             ]
         )
-        return full_interpolation(target).squeeze()
+        # resolve the core once and take Q from the data it interpolated,
+        # so I and Q match even if the dataset is swapped mid-trigger
+        resolved = _resolve(core)
+        if isinstance(resolved, LazyInterpolationCore):
+            resolved = resolved.get()
+        I = resolved(target).squeeze()
+        # a remote core only knows its data once it has answered
+        interpolated = getattr(resolved, "dataset", None)
+        if interpolated is None:
+            interpolated = _resolve(dataset)
+        current["Q"] = interpolated.Q
+        return I
+
+    def _Q():
+        if "Q" not in current:
+            return _resolve(dataset).Q
+        return current["Q"]
 
-    # define the device class
+    class TriggeredRO(SynSignalRO):
+        # read-only, but re-evaluates *func* when triggered
+        def trigger(self):
+            Signal.put(self, self._func(), force=True)
+            return NullStatus()
+
+    # define the device class, the components are lazy so that nothing
+    # waits on the data until the first trigger (or describe)
     class FullI(Device):
         # this closes over the function so it is bound to the ctrl object
         # passed in
-        I = Cpt(SynSignal, func=_resample, kind="hinted")
-        # this is always the same
-        Q = Cpt(SynSignalRO, func=lambda: Q_data, kind="normal")
+        I = Cpt(SynSignal, func=_resample, kind="hinted", lazy=True)
+        # this only changes if the dataset is swapped, see SimSource.reload
+        Q = Cpt(TriggeredRO, func=_Q, kind="normal", lazy=True)
 
         # we need to forward the trigger method so that the curve updates
         def trigger(self):
-            self.I.trigger()
-            return super().trigger()
+            with trace.span(f"trigger {self.name}", "ticu"):
+                self.I.trigger()
+                self.Q.trigger()
+                return super().trigger()
 
     # instantiate and return the device
     return FullI(name=name)
 
 
-def make_ROI_detector(ctrl, peak_locations, reduce_function, *, cat, name):
+def make_ROI_detector(
+    ctrl,
+    peak_locations,
+    reduce_function,
+    *,
+    cat=None,
+    name,
+    dataset=None,
+    core=None,
+    tolerance=None,
+    replicates="mean",
+):
     """
     Simulated detector that provides ROI values.
 
@@ -155,10 +1118,22 @@ def make_ROI_detector(ctrl, peak_locations, reduce_function, *, cat, name):
 
             def reduce(h: BlueskyRun, peak_locations : array[float]) -> array[float]:
                 ...
-    cat : Catalog
+    cat : Catalog, optional
         The source of the experimental data we need to interpolate
     name : str
         The base name of the created device
+    dataset : SimDataset, optional
+        The already extracted data to interpolate, used instead of *cat*.
+        Its *rois* must have been reduced with *peak_locations*.
+    core : InterpolationCore or LazyInterpolationCore or Future, optional
+        The interpolation of ``dataset.rois``.  If not given, it is built
+        from *dataset* on the first trigger.
+    tolerance : float or array[float], optional
+        If given, combine runs within this distance of each other on every
+        axis before building the interpolation, see `combine_replicates`.
+        0 combines exact replicates only.
+    replicates : {'mean', 'median', 'first', 'latest'}
+        How to combine the replicates
 
     Returns
     -------
@@ -167,38 +1142,50 @@ def make_ROI_detector(ctrl, peak_locations, reduce_function, *, cat, name):
        given.  For each position, there will be components *I_{NN}* and *Q_{NN}*
        corresponding to the NNth peak location passed in.
     """
-    # get the BlueskyRun instances
-    data = [cat[uid] for uid in cat]
-    # extract the measured control parameters, reduce the data, and setup
-    # the interpolation
-    reduced_interpolation = scipy.interpolate.LinearNDInterpolator(
-        np.vstack([extract_coords(h) for h in data]),
-        np.vstack([reduce_data(h, peak_locations) for h in data]),
-    )
+    from ophyd import Device, Component as Cpt
+    from ophyd.sim import SynSignal, SynSignalRO
+
+    if core is None:
+        if dataset is None:
+            dataset = load_dataset(
+                cat, peak_locations, reduce_function=reduce_function
+            )
+        # setup the interpolation from the measured control parameters
+        core = LazyInterpolationCore(
+            lambda: _build_core(_resolve(dataset), "rois", tolerance, replicates)
+        )
 
     # ######
     # this code is too cute for it's own good
     # ######
 
-    # helpers to do the resampling on demand:
-    @functools.lru_cache()
-    def _base_resample(target):
-        # target = np.array(target)
-        return reduced_interpolation(target).squeeze()
+    # the ROIs at the last trigger
+    current = {}
 
-    def _per_peak_resample(indx):
+    # helpers to do the resampling on demand:
+    def _resample():
         target = (
             ctrl.Ti.readback.get(),
             ctrl.anneal_time.readback.get(),
             ctrl.temp.readback.get(),
         )
-        return _base_resample(target)[indx]
+        # all of the ROIs of a trigger come from one interpolation, so
+        # they are from the same data even if it changes mid-trigger
+        current["rois"] = np.asarray(_resolve(core)(target)).reshape(-1)
+
+    def _per_peak_resample(indx):
+        if "rois" not in current:
+            _resample()
+        return current["rois"][indx]
 
     # define the (variable) number of ROI and peak location components
     # these will re-sample on trigger
     peaks = {
         f"I_{indx:02d}": Cpt(
-            SynSignal, func=functools.partial(_per_peak_resample, indx), kind="hinted",
+            SynSignal,
+            func=functools.partial(_per_peak_resample, indx),
+            kind="hinted",
+            lazy=True,
         )
         for indx in range(len(peak_locations))
     }
@@ -208,14 +1195,16 @@ def make_ROI_detector(ctrl, peak_locations, reduce_function, *, cat, name):
         for indx, q in enumerate(peak_locations)
     }
 
-    # a base class that will forward the trigger call to the I_NN components
-    # to do the resampling
+    # a base class that will resample and forward the trigger call to the
+    # I_NN components to pick up the new values
     class ForwardTrigger(Device):
         def trigger(self):
-            for cpt_name in self.component_names:
-                if cpt_name.startswith("I_"):
-                    getattr(self, cpt_name).trigger()
-            return super().trigger()
+            with trace.span(f"trigger {self.name}", "ticu"):
+                _resample()
+                for cpt_name in self.component_names:
+                    if cpt_name.startswith("I_"):
+                        getattr(self, cpt_name).trigger()
+                return super().trigger()
 
     # define the Device class via type
     ROIDetector = type("ROIDetector", (ForwardTrigger,), {**peaks, **qs})
@@ -224,21 +1213,354 @@ def make_ROI_detector(ctrl, peak_locations, reduce_function, *, cat, name):
     return ROIDetector(name=name)
 
 
-def make_sim_devices(cat, peak_locations=None):
-    if peak_locations is None:
-        peak_locations = [
-            1.540,  #
-            2.665,  # *
-            2.945,  # *
-            3.077,  # *
-            3.549,  #
-            3.775,  #
-            3.870,  #
-            4.614,  # *
-            5.019,  #
-            5.323,  #
-            5.330,  #
-        ]
+def _with_rois(dataset, peak_locations):
+    """Return *dataset*, re-reducing its ROIs if they are not at *peak_locations*."""
+    if dataset.rois is not None and np.array_equal(
+        dataset.peak_locations, peak_locations
+    ):
+        return dataset
+    return SimDataset(
+        dataset.coords,
+        dataset.I,
+        dataset.Q,
+        rois=reduce_array(dataset.I, dataset.Q, peak_locations),
+        peak_locations=list(peak_locations),
+        uids=dataset.uids,
+        provenance=dataset.provenance,
+        triangulation=dataset.triangulation,
+    )
+
+
+def _append(buffer, n, rows):
+    """
+    Write *rows* after the first *n* rows of *buffer*.
+
+    If *buffer* is too small, or read-only, it is replaced by a larger
+    copy so that appending is amortized O(len(rows)).  Returns the buffer.
+    """
+    rows = np.asarray(rows)
+    if n + len(rows) > len(buffer) or not buffer.flags.writeable:
+        grown = np.empty(
+            (max(2 * n, n + len(rows)),) + buffer.shape[1:],
+            dtype=np.result_type(buffer, rows),
+        )
+        grown[:n] = buffer[:n]
+        buffer = grown
+    buffer[n : n + len(rows)] = rows
+    return buffer
+
+
+class SimSource:
+    """
+    The data behind the simulated detectors.
+
+    Runs added to the catalog during a session can be picked up with
+    `update`, or periodically with `watch`.  Only the new runs are read
+    and the interpolation of each detector is extended in place.
+
+    The whole dataset can be replaced, e.g. by a new reduction, with
+    `reload` without re-creating the devices.
+    """
+
+    def __init__(
+        self,
+        dataset,
+        *,
+        cat=None,
+        reduce_function=reduce_data,
+        tolerance=None,
+        replicates="mean",
+    ):
+        """
+
+        Parameters
+        ----------
+        dataset : SimDataset or Future
+            The data to start with
+
+        cat : Catalog, optional
+            The catalog to look for new runs in
+
+        reduce_function : Callable[[BlueskyRun, array[float]], array[float]]
+            The function used to reduce the I(Q) curves of new runs
+
+        tolerance : float or array[float], optional
+            If given, combine runs within this distance of each other
+            before building the interpolation, see `combine_replicates`.
+
+        replicates : {'mean', 'median', 'first', 'latest'}
+            How to combine the replicates
+        """
+        self._dataset = dataset
+        self.cat = cat
+        self.reduce_function = reduce_function
+        self.tolerance = tolerance
+        self.replicates = replicates
+        self._buffers = None
+        # bumped whenever the dataset changes, each core records the
+        # version it interpolates as *source_version*
+        self._version = 0
+        self._lock = threading.Lock()
+        self._update_lock = threading.Lock()
+        self.full = LazyInterpolationCore(functools.partial(self._build, "I"))
+        self.rois = LazyInterpolationCore(functools.partial(self._build, "rois"))
+
+    @property
+    def dataset(self):
+        """The current `SimDataset`, waits if it is still loading."""
+        return _resolve(self._dataset)
+
+    def _build(self, field):
+        # only hold the lock to take a consistent snapshot, so the cores
+        # can be built concurrently
+        with self._lock:
+            dataset, version = self._dataset, self._version
+        core = _build_core(_resolve(dataset), field, self.tolerance, self.replicates)
+        core.source_version = version
+        return core
+
+    def update(self, cat=None):
+        """
+        Add the runs in *cat* that are not in the dataset yet.
+
+        Parameters
+        ----------
+        cat : Catalog, optional
+            Defaults to the catalog the source was made with
+
+        Returns
+        -------
+        int
+            The number of runs added
+        """
+        cat = self.cat if cat is None else cat
+        if cat is None:
+            raise ValueError("this source has no catalog to look for new runs in")
+        with self._update_lock:
+            dataset = self.dataset
+            known = set(dataset.uids or ())
+            new_uids = [uid for uid in cat if uid not in known]
+            if not new_uids:
+                return 0
+            new = load_dataset(
+                {uid: cat[uid] for uid in new_uids},
+                dataset.peak_locations,
+                reduce_function=self.reduce_function,
+                q_grid=dataset.Q,
+                dtype=dataset.I.dtype,
+            )
+
+            with self._lock:
+                n = len(dataset)
+                if self._buffers is None:
+                    self._buffers = {
+                        k: getattr(dataset, k)
+                        for k in ("coords", "I", "rois")
+                        if getattr(dataset, k) is not None
+                    }
+                for k, buffer in self._buffers.items():
+                    self._buffers[k] = _append(buffer, n, getattr(new, k))
+                views = {k: v[: n + len(new)] for k, v in self._buffers.items()}
+                self._dataset = updated = SimDataset(
+                    views["coords"],
+                    views["I"],
+                    dataset.Q,
+                    rois=views.get("rois"),
+                    peak_locations=dataset.peak_locations,
+                    uids=list(dataset.uids) + new.uids,
+                    provenance=dataset.provenance,
+                )
+                self._version += 1
+                version = self._version
+
+            def refresh(core, k):
+                if core.source_version == version:
+                    # built from the new data while we were swapping
+                    return core
+                if self.tolerance is not None:
+                    # new runs may join existing clusters, rebuild on
+                    # the next trigger
+                    return None
+                core.extend(views["coords"], views[k])
+                core.dataset, core.source_version = updated, version
+                return core
+
+            # cores that have not been built yet will see the new data,
+            # a core being built is waited for and then brought up to date
+            for core, k in ((self.full, "I"), (self.rois, "rois")):
+                if k in views:
+                    core.replace(functools.partial(refresh, k=k))
+            return len(new)
+
+    def reload(self, cat, *, background=True):
+        """
+        Replace the data behind the detectors.
+
+        The new data is read, and the interpolations in use are rebuilt,
+        before anything is swapped so triggers keep using the old data
+        until the new data is ready.  Plans and subscriptions keep their
+        references to the devices.
+
+        Parameters
+        ----------
+        cat : Catalog or str or SimDataset
+            The new reduced catalog, path to a packed dataset file, or
+            dataset.  It is reduced with the current peak locations if
+            needed.
+
+        background : bool, default True
+            If True, do the work in a background thread and return a
+            `Future` right away.
+
+        Returns
+        -------
+        SimDataset or Future
+            The new dataset
+        """
+        if background:
+            executor = ThreadPoolExecutor(1, thread_name_prefix="sbu_sim-reload")
+            future = executor.submit(self.reload, cat, background=False)
+            executor.shutdown(wait=False)
+            return future
+
+        peak_locations = self.dataset.peak_locations
+        if isinstance(cat, SimDataset):
+            dataset, cat = cat, None
+        elif isinstance(cat, (str, os.PathLike)):
+            from . import packed
+
+            dataset, cat = packed.load(cat), None
+        else:
+            dataset = load_dataset(
+                cat,
+                peak_locations,
+                reduce_function=self.reduce_function,
+                dtype=self.dataset.I.dtype,
+            )
+        dataset = _with_rois(dataset, peak_locations)
+
+        with trace.span("reload", "ticu"):
+            # only rebuild what has been used, the others stay lazy
+            cores = [
+                (core, _build_core(dataset, k, self.tolerance, self.replicates))
+                if core.built
+                else (core, None)
+                for core, k in ((self.full, "I"), (self.rois, "rois"))
+            ]
+        with self._update_lock:
+            with self._lock:
+                self._dataset = dataset
+                self._buffers = None
+                self.cat = cat
+                self._version += 1
+                version = self._version
+
+            def swap(core, new):
+                # keep a core built from the new data while we swapped,
+                # otherwise use the new core or rebuild on the next use
+                return core if core.source_version == version else new
+
+            # not under the source lock, a build in progress holds its
+            # core's lock and then takes the source lock
+            for core, new in cores:
+                if new is not None:
+                    new.source_version = version
+                core.replace(functools.partial(swap, new=new))
+        return dataset
+
+    def watch(self, interval=10):
+        """
+        Call `update` every *interval* seconds from a background thread.
+
+        Returns
+        -------
+        threading.Event
+            Set this to stop watching
+        """
+        if self.cat is None:
+            raise ValueError("this source has no catalog to watch for new runs")
+        stop = threading.Event()
+
+        def watcher():
+            while not stop.wait(interval):
+                try:
+                    self.update()
+                except Exception:
+                    logger.exception("Failed to add new runs to the simulation")
+
+        threading.Thread(target=watcher, name="sbu_sim-watch", daemon=True).start()
+        return stop
+
+
+def make_sim_devices(
+    cat=None,
+    peak_locations=None,
+    *,
+    dataset=None,
+    background=False,
+    tolerance=None,
+    replicates="mean",
+    dtype=None,
+    server=None,
+):
+    """
+    Create the simulated controls and detectors.
+
+    Parameters
+    ----------
+    cat : Catalog or str or List[Catalog], optional
+        The source of the experimental data to interpolate, or the path
+        to a packed dataset file (see `sbu_sim.packed`), which is
+        memory-mapped.  Several catalogs are merged with `merge_catalogs`.
+
+    peak_locations : array[float], optional
+        The locations in Q space to look for features.  Defaults to
+        `DEFAULT_PEAK_LOCATIONS`, or the peaks *dataset* was reduced with.
+
+    dataset : SimDataset, optional
+        The already extracted data to interpolate, used instead of *cat*.
+        It must include the ROIs, they are reduced again if they were
+        reduced with peaks other than *peak_locations*.
+
+    background : bool, default False
+        If True, return the devices immediately and read the catalog and
+        build the interpolation in a background thread.  The first
+        trigger of a detector waits for the loading to finish, and raises
+        if it failed.
+
+        Otherwise the catalog is read now and the interpolation of each
+        detector is built on its first trigger (or describe), so a
+        detector that is never used costs nothing.
+
+    tolerance : float or array[float], optional
+        If given, combine runs within this distance of each other on every
+        axis of (Ti, anneal_time, temp) before building the
+        interpolation, see `combine_replicates`.  0 combines exact
+        replicates only.
+
+    replicates : {'mean', 'median', 'first', 'latest'}
+        How to combine the replicates
+
+    dtype : dtype, optional
+        Store the curves read from *cat* with this dtype, see
+        `load_dataset`.
+
+    server : str, optional
+        The socket of a ``python -m sbu_sim serve`` process to ask for the
+        interpolated values instead of loading anything, see
+        `sbu_sim.server`.  The detectors share the `sbu_sim.server.SimClient`
+        as their *client* attribute.
+
+    Returns
+    -------
+    dict[str, Device]
+        The *ctrl*, *full*, and *rois* devices keyed on their names.  The
+        detectors share the `SimSource` they interpolate as their *source*
+        attribute, ``rois.source.update()`` picks up new runs in *cat* and
+        ``rois.source.reload(new_cat)`` swaps in a different dataset.
+    """
+    from ophyd import Device, Component as Cpt
+    from ophyd.sim import SynAxis
 
     class Control(Device):
         Ti = Cpt(SynAxis, value=50)
@@ -247,9 +1569,79 @@ def make_sim_devices(cat, peak_locations=None):
 
     ctrl = Control(name="ctrl")
 
-    full = make_full_IofQ_detector(ctrl, cat=cat, name="full")
+    if server is not None:
+        from .server import SimClient
+
+        client = SimClient(server)
+        if peak_locations is not None and not np.array_equal(
+            peak_locations, client.peak_locations
+        ):
+            raise ValueError(
+                f"the server's ROIs are at {client.peak_locations}, "
+                f"not {list(peak_locations)}"
+            )
+        full = make_full_IofQ_detector(
+            ctrl, name="full", dataset=client, core=client.full
+        )
+        rois = make_ROI_detector(
+            ctrl,
+            client.peak_locations,
+            name="rois",
+            reduce_function=reduce_data,
+            core=client.rois,
+        )
+        full.client = rois.client = client
+        return {obj.name: obj for obj in [ctrl, full, rois]}
+
+    if isinstance(cat, (str, os.PathLike)):
+        from . import packed
+
+        dataset = packed.load(cat)
+    if peak_locations is None:
+        if dataset is not None and dataset.peak_locations is not None:
+            peak_locations = dataset.peak_locations
+        else:
+            peak_locations = DEFAULT_PEAK_LOCATIONS
+    if dataset is not None:
+        if dataset.rois is None:
+            raise ValueError(
+                "the dataset has no ROIs, load it with peak locations or "
+                "reduce them with reduce_array"
+            )
+        # the ROIs must be the ones the detector is made for
+        dataset = _with_rois(dataset, peak_locations)
+
+    load = load_dataset
+    if isinstance(cat, (list, tuple)):
+        load = merge_catalogs
+    load = functools.partial(load, dtype=dtype)
+    executor = None
+    if background:
+        executor = ThreadPoolExecutor(1, thread_name_prefix="sbu_sim-load")
+        if dataset is None:
+            dataset = executor.submit(load, cat, peak_locations)
+    elif dataset is None:
+        # only walk the catalog once for both detectors
+        dataset = load(cat, peak_locations)
+    # only a single catalog can be watched for new runs
+    if isinstance(cat, (list, tuple, str, os.PathLike)):
+        cat = None
+    source = SimSource(dataset, cat=cat, tolerance=tolerance, replicates=replicates)
+    if executor is not None:
+        # a trigger that comes first builds the core itself and the
+        # worker then finds it already built
+        executor.submit(source.full.get)
+        executor.submit(source.rois.get)
+        executor.shutdown(wait=False)
+    full = make_full_IofQ_detector(ctrl, name="full", dataset=source, core=source.full)
     rois = make_ROI_detector(
-        ctrl, peak_locations, cat=cat, name="rois", reduce_function=reduce_data
+        ctrl,
+        peak_locations,
+        name="rois",
+        reduce_function=reduce_data,
+        dataset=dataset,
+        core=source.rois,
     )
+    full.source = rois.source = source
 
     return {obj.name: obj for obj in [ctrl, full, rois]}
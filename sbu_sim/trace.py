@@ -0,0 +1,179 @@
+"""
+Record a timeline of a simulated experiment as a Chrome trace.
+
+The trace can be loaded into https://ui.perfetto.dev (or chrome://tracing)
+to see how motor moves, detector triggers, interpolation, callbacks, and
+the recommendation engine overlap across threads and processes.
+
+Tracing is off by default and costs one function call per span when off.
+Turn it on for a whole session with ``sbu_sim.initialize(..., trace_path=path)``
+or `enable`, or for a single plan with `trace_plan`.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+
+_NULL_SPAN = contextlib.nullcontext()
+_tracer = None
+
+
+class Tracer:
+    """Collect complete ('X') events in the Chrome trace event format."""
+
+    def __init__(self, path=None):
+        """
+
+        Parameters
+        ----------
+        path : str, optional
+            Where `write` puts the trace by default.
+        """
+        self.path = path
+        self.events = []
+        self._thread_names = {}
+
+    @contextlib.contextmanager
+    def span(self, name, category="sbu_sim", **args):
+        """Record the time spent in the body of the with block."""
+        thread = threading.current_thread()
+        self._thread_names[thread.ident] = thread.name
+        start = time.time_ns()
+        try:
+            yield
+        finally:
+            # list.append is atomic, no lock needed across threads
+            self.events.append(
+                {
+                    "name": name,
+                    "cat": category,
+                    "ph": "X",
+                    # microseconds since the epoch so processes line up
+                    "ts": start / 1000,
+                    "dur": (time.time_ns() - start) / 1000,
+                    "pid": os.getpid(),
+                    "tid": thread.ident,
+                    "args": args,
+                }
+            )
+
+    def to_json(self):
+        """Return the trace as a Chrome trace dict."""
+        pid = os.getpid()
+        metadata = [
+            {
+                "name": "thread_name",
+                "ph": "M",
+                "pid": pid,
+                "tid": tid,
+                "args": {"name": name},
+            }
+            for tid, name in self._thread_names.items()
+        ]
+        return {"traceEvents": metadata + self.events, "displayTimeUnit": "ms"}
+
+    def write(self, path=None):
+        """Write the trace as JSON to *path* (defaults to ``self.path``)."""
+        path = path or self.path
+        with open(path, "w") as fout:
+            json.dump(self.to_json(), fout)
+        return path
+
+
+def enable(path=None):
+    """Start recording spans in this process and return the `Tracer`."""
+    global _tracer
+    _tracer = Tracer(path)
+    return _tracer
+
+
+def disable():
+    """Stop recording spans and return the `Tracer` that was in use."""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def get_tracer():
+    """Return the active `Tracer` or `None`."""
+    return _tracer
+
+
+def span(name, category="sbu_sim", **args):
+    """
+    Context manager recording a span on the active tracer, if any.
+
+    Parameters
+    ----------
+    name : str
+        What is being timed, e.g. 'move' or 'interpolate'
+
+    category : str, default 'sbu_sim'
+        Used by the viewers to group and filter spans
+
+    **args
+        Extra information shown with the span
+    """
+    if _tracer is None:
+        return _NULL_SPAN
+    return _tracer.span(name, category, **args)
+
+
+def flush():
+    """
+    Write this process' trace, if tracing, to ``'{path}.{pid}.json'``.
+
+    Use this at the end of work in a child process, then combine the
+    files with `merge`.
+    """
+    if _tracer is None or _tracer.path is None:
+        return None
+    root, _ = os.path.splitext(_tracer.path)
+    return _tracer.write(f"{root}.{os.getpid()}.json")
+
+
+def merge(paths, out_path):
+    """Combine the traces in *paths* into a single file."""
+    events = []
+    for path in paths:
+        with open(path) as fin:
+            events.extend(json.load(fin)["traceEvents"])
+    with open(out_path, "w") as fout:
+        json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, fout)
+    return out_path
+
+
+def trace_plan(plan, path):
+    """
+    Trace a single plan and write the trace to *path* when it finishes.
+
+    Parameters
+    ----------
+    plan : Generator[Msg]
+        The plan to run
+
+    path : str
+        Where to write the Chrome trace
+    """
+    global _tracer
+    previous = _tracer
+    tracer = _tracer = Tracer(path)
+    try:
+        return (yield from plan)
+    finally:
+        tracer.write()
+        if previous is not None:
+            previous.events.extend(tracer.events)
+        _tracer = previous
+
+
+def _reset_in_child():
+    # a forked child starts with a copy of the parent's events, drop them
+    # so each process only writes what it did
+    if _tracer is not None:
+        _tracer.events = []
+        _tracer._thread_names = {}
+
+
+os.register_at_fork(after_in_child=_reset_in_child)